@@ -1,15 +1,19 @@
 import argparse
-import json
 import os
-from typing import Dict, List, Optional, Tuple
+import time
+from functools import partial
+from multiprocessing import Pool
+from typing import Dict, List, Optional, Set, Tuple
 
 from dotenv import load_dotenv
-from github import GithubException
 from github.ContentFile import ContentFile
 from github.Repository import Repository
 from neo4j import Driver, Session
 
+from checkpoint_store import CheckpointStore, DependencyEdge
 from connect_neo4j import connect_neo4j
+from local_mirror import LocalRepository, find_local_repositories, get_local_repo_properties, read_package_jsons
+from manifest import MANIFEST_FILE_NAMES, extract_repo_dependencies
 from repository_search import RepositorySearch
 from setup_logger import setup_logger
 
@@ -20,7 +24,7 @@ def find_package_jsons(
         repo: Repository,
         max_depth: int = 3,
 ) -> List[ContentFile]:
-    """Recursively find package.json files in a repository"""
+    """Recursively find package.json (and pnpm-workspace.yaml) files in a repository"""
 
     def search_contents(
             contents: List[ContentFile],
@@ -31,64 +35,74 @@ def find_package_jsons(
 
         found_packages = []
         for content in contents:
-            try:
-                if content.type == 'dir':
-                    # Recursively search directories
-                    dir_contents = repo.get_contents(content.path)
-                    found_packages.extend(
-                        search_contents(dir_contents, current_depth + 1)
-                    )
-                elif content.name == 'package.json':
-                    found_packages.append(content)
-            except GithubException as e:
-                logger.warning(f"Error processing {content.path}: {e}")
+            if content.type == 'dir':
+                # Recursively search directories
+                dir_contents = repo.get_contents(content.path)
+                found_packages.extend(
+                    search_contents(dir_contents, current_depth + 1)
+                )
+            elif content.name in MANIFEST_FILE_NAMES:
+                found_packages.append(content)
 
         return found_packages
 
-    try:
-        root_contents = repo.get_contents("/")
-        return search_contents(root_contents)
-    except Exception as e:
-        logger.error(f"Could not find package.json in {repo.full_name}: {e}")
-        return []
+    # Errors (e.g. the rate limit) are not caught on purpose, on any level: an incomplete result would be taken as
+    # "these package.json files were removed" and lead to the deletion of the repo's dependency edges.
+    # The repo is then not marked as processed, so it's retried on the next crawl.
+    root_contents = repo.get_contents("/")
+    return search_contents(root_contents)
 
 
-def parse_package_file_dependencies(package_file: ContentFile, root_package_file: Optional[ContentFile]) -> Dict[
-    str, Dict[str, str]]:
-    """
-    Take a package file and, optionally, its root package file and parse the dependencies.
-    If a root package file is provided, the devDependencies of both files are merged in the final output.
+def get_edge_name(dependency_type: str) -> str:
+    match dependency_type:
+        case 'dependencies':
+            return 'PROD_DEPENDENCY'
+        case 'peerDependencies':
+            return 'PEER_DEPENDENCY'
+        case 'devDependencies':
+            return 'DEV_DEPENDENCY'
+
+
+def to_dependency_edges(dependencies: Dict[str, Dict[str, str]]) -> Set[DependencyEdge]:
+    """Flatten parsed dependencies into a set of (dependency type, dependency name) edges."""
+    return {
+        (dependency_type, dependency_name)
+        for dependency_type in dependencies
+        for dependency_name in dependencies.get(dependency_type)
+    }
 
-    :param package_file:        The package file to process
-    :param root_package_file:   A root package file that can be provided in the case of a monorepo
-    :return:                    A dictionary of dependencies and metadata, e.g. { dependencies: { lodash: 1.3.0 } }
-    """
 
-    def extract_deps(file: ContentFile) -> Dict[str, Dict[str, str]]:
-        try:
-            data = json.loads(file.decoded_content.decode('utf-8'))
-            return {
-                'dependencies': data.get('dependencies', {}),
-                'peerDependencies': data.get('peerDependencies', {}),
-                'devDependencies': data.get('devDependencies', {}),
-            }
-        except (json.JSONDecodeError, UnicodeDecodeError) as e:
-            logger.warning(f"Could not parse {file.path}: {e}")
-            return {'dependencies': {}, 'peerDependencies': {}, 'devDependencies': []}
+def to_dependencies(edges: Set[DependencyEdge]) -> Dict[str, Dict[str, str]]:
+    """Group (dependency type, dependency name) edges back into the format of the parsed dependencies."""
+    dependencies = {}
+    for dependency_type, dependency_name in sorted(edges):
+        dependencies.setdefault(dependency_type, {})[dependency_name] = ''
+    return dependencies
 
-    parsed_file = extract_deps(package_file)
 
-    if root_package_file:
-        parsed_root_file = extract_deps(root_package_file)
-        parsed_file['devDependencies'] = {**parsed_root_file.get('devDependencies'),
-                                          **parsed_file.get('devDependencies')}
+def get_repo_metadata(repo: Repository) -> Dict:
+    """Get the properties of the repo node that are part of the search result, i.e. that need no further API call."""
+    return {
+        'name': repo.full_name,
+        'stars': repo.stargazers_count,
+        'watchers': repo.watchers_count,
+        'open_issues': repo.open_issues_count,
+        'last_modified': repo.updated_at.isoformat(),
+        'url': repo.html_url,
+    }
 
-    return parsed_file
+
+def get_repo_properties(repo: Repository) -> Dict:
+    """Get the properties of the repo node (stars, url, ...) of a GitHub repository."""
+    return {
+        **get_repo_metadata(repo),
+        'contributors': repo.get_contributors().totalCount,
+    }
 
 
 def store_in_database(
         session: Session,
-        repo: Repository,
+        repo_properties: Dict,
         dependencies: Dict[str, Dict[str, str]]
 ) -> None:
     """Create Neo4j graph transaction for a repository"""
@@ -102,26 +116,18 @@ def store_in_database(
             - Create edges between nodes.
     """
 
-    def upsert_repo_node(repo: Repository) -> None:
+    def upsert_repo_node(repo_properties: Dict) -> None:
         """Upsert the repo information (stars, url, ...) of a package in the database"""
+        # Merge on the name only, the package node might already exist because another repo depends on it
         session.run("""
-        MERGE (package:Package {
-            name: $name,
-            stars: $stars,
-            watchers: $watchers,
-            open_issues: $open_issues,
-            contributors: $contributors,
-            last_modified: datetime($last_modified),
-            url: $url
-        })
+        MERGE (package:Package {name: $name})
+        SET package += $properties, package.last_modified = datetime($last_modified)
         """, {
-            'name': repo.full_name,
-            'stars': repo.stargazers_count,
-            'watchers': repo.watchers_count,
-            'open_issues': repo.open_issues_count,
-            'contributors': repo.get_contributors().totalCount,
-            'last_modified': repo.updated_at.isoformat(),
-            'url': repo.html_url,
+            'name': repo_properties['name'],
+            'last_modified': repo_properties['last_modified'],
+            'properties': {
+                key: value for key, value in repo_properties.items() if key not in ('name', 'last_modified')
+            },
         })
 
     def upsert_dependency_node(dependency: str) -> None:
@@ -143,60 +149,89 @@ def store_in_database(
             'dependency': dependency
         })
 
-    def get_edge_name(dependency_type: str) -> str:
-        match dependency_type:
-            case 'dependencies':
-                return 'PROD_DEPENDENCY'
-            case 'peerDependencies':
-                return 'PEER_DEPENDENCY'
-            case 'devDependencies':
-                return 'DEV_DEPENDENCY'
-
-    upsert_repo_node(repo)
+    upsert_repo_node(repo_properties)
 
     for dependency_type in dependencies:
         for dependency_name in dependencies.get(dependency_type):
             upsert_dependency_node(dependency_name)
             edge_name = get_edge_name(dependency_type)
-            insert_dependency_edge(repo.full_name, dependency_name, edge_name)
-
-
-def find_root_package_file(package_files: List[ContentFile]) -> Optional[ContentFile]:
-    """Find the root package.json file if there is one."""
-    for package_file in package_files:
-        try:
-            data = json.loads(package_file.decoded_content.decode('utf-8'))
-            if 'workspaces' in data:
-                return package_file
-        except (json.JSONDecodeError, UnicodeDecodeError) as e:
-            logger.warning(f"Could not parse {package_file.path}: {e}")
-        return None
+            insert_dependency_edge(repo_properties['name'], dependency_name, edge_name)
 
 
-def extract_root_package_file(package_files: List[ContentFile]) -> Tuple[List[ContentFile], Optional[ContentFile]]:
-    """
-        Take a list of all package files and extract the root package file from it.
-        Return a tuple containing all non-root package files and, if found, the root package file.
+def remove_from_database(
+        session: Session,
+        repo_name: str,
+        dependencies: Dict[str, Dict[str, str]]
+) -> None:
+    """Delete the dependency edges of a repository that don't exist anymore"""
+    for dependency_type in dependencies:
+        for dependency_name in dependencies.get(dependency_type):
+            edge_name = get_edge_name(dependency_type)
+            session.run(f"""
+            MATCH (repo:Package {{name: $repo_name}})-[r:{edge_name}]->(pkg:Package {{name: $dependency}})
+            DELETE r
+            """, {
+                'repo_name': repo_name,
+                'dependency': dependency_name
+            })
+
+
+def collect_dependency_edges(package_files: List[ContentFile]) -> Set[DependencyEdge]:
+    """Parse all package files of a repository and return the dependency edges of the repository."""
+    return to_dependency_edges(extract_repo_dependencies(package_files))
+
+
+def process_package_files(
+        session: Session,
+        repo: Repository,
+        package_files: List[ContentFile],
+        previous_edges: Set[DependencyEdge],
+) -> Set[DependencyEdge]:
     """
-    root_package_file = find_root_package_file(package_files)
-    if root_package_file:
-        return [file for file in package_files if file != root_package_file], root_package_file
-    return package_files, None
+    Parse all package files of a repository and write the dependency edges that changed since the last crawl.
 
+    :param session:         Neo4j session
+    :param repo:            The repository the package files belong to
+    :param package_files:   All package files of the repository
+    :param previous_edges:  Dependency edges written during the last crawl (empty if the repo is new)
+    :return:                The current dependency edges of the repository
+    """
+    edges = collect_dependency_edges(package_files)
+    write_changed_edges(session, get_repo_properties(repo), edges, previous_edges)
+    return edges
 
-def process_package_files(session: Session, repo: Repository, package_files: List[ContentFile]):
-    [non_root_package_files, root_package_file] = extract_root_package_file(package_files)
 
-    for non_root_package_file in non_root_package_files:
-        dependencies = parse_package_file_dependencies(non_root_package_file, root_package_file)
-        store_in_database(session, repo, dependencies)
+def write_changed_edges(
+        session: Session,
+        repo_properties: Dict,
+        edges: Set[DependencyEdge],
+        previous_edges: Set[DependencyEdge],
+) -> None:
+    """Upsert the repo node and write the difference between the current and the previously written edges."""
+    store_in_database(session, repo_properties, to_dependencies(edges - previous_edges))
+    remove_from_database(session, repo_properties['name'], to_dependencies(previous_edges - edges))
 
 
 def process_repository(
         driver: Driver,
-        repo: Repository
+        repo: Repository,
+        checkpoint_store: CheckpointStore,
 ) -> None:
     """Process a single repository"""
+    if not checkpoint_store.has_repo_been_pushed(repo):
+        # The package.json files can't have changed, so we don't walk the repository
+        if checkpoint_store.has_repo_been_updated(repo) and checkpoint_store.get_manifest_shas(repo.full_name):
+            try:
+                with driver.session() as session:
+                    store_in_database(session, get_repo_metadata(repo), {})
+                checkpoint_store.mark_processed(repo)
+                logger.info(f"Refreshed the stars etc. of {repo.full_name}, not pushed to since the last crawl")
+            except Exception as e:
+                logger.error(f"Failed to refresh {repo.full_name}: {e}")
+        else:
+            logger.info(f"Skipping {repo.full_name}, unchanged since the last crawl")
+        return
+
     logger.info(f"Processing {repo.full_name}")
 
     """
@@ -211,13 +246,24 @@ def process_repository(
 
     try:
         package_jsons = find_package_jsons(repo)
-
-        if not package_jsons:
-            logger.info(f"No package.json found in {repo.full_name}")
+        manifest_shas = {package_json.path: package_json.sha for package_json in package_jsons}
+
+        if manifest_shas == checkpoint_store.get_manifest_shas(repo.full_name):
+            if package_jsons:
+                logger.info(f"No package.json changed in {repo.full_name}")
+                # The dependency edges are up to date, but the stars, last_modified etc. of the repo node might not be
+                with driver.session() as session:
+                    store_in_database(session, get_repo_properties(repo), {})
+            else:
+                logger.info(f"No package.json found in {repo.full_name}")
+            checkpoint_store.mark_processed(repo, manifest_shas)
             return
 
         with driver.session() as session:
-            process_package_files(session, repo, package_jsons)
+            previous_edges = checkpoint_store.get_dependency_edges(repo.full_name)
+            edges = process_package_files(session, repo, package_jsons, previous_edges)
+
+        checkpoint_store.mark_processed(repo, manifest_shas, edges)
 
         logger.info(f"Processed {repo.full_name} successfully")
 
@@ -229,21 +275,86 @@ def crawl_github(
         driver: Driver,
         github_token: str,
         min_stars: int,
+        checkpoint_store: CheckpointStore,
 ) -> None:
     """Crawl GitHub repositories and build ecosystem graph"""
     try:
         js_repo_search = RepositorySearch(github_token, min_stars, "JavaScript")
         for repo in js_repo_search.query():
-            process_repository(driver, repo)
+            process_repository(driver, repo, checkpoint_store)
 
         ts_repo_search = RepositorySearch(github_token, min_stars, "TypeScript")
         for repo in ts_repo_search.query():
-            process_repository(driver, repo)
+            process_repository(driver, repo, checkpoint_store)
 
     except Exception as e:
         logger.error(f"Error while crawling GitHub: {e}")
 
 
+def parse_local_repository(
+        mirror_dir: str,
+        repo_path: str,
+) -> Optional[Tuple[Dict, Dict[str, str], Set[DependencyEdge]]]:
+    """
+    Parse a repository of the local mirror. This runs in a worker process of the pool.
+
+    :return: The properties of the repo node, the SHAs of its package.json files by path and its dependency edges
+             or None if it couldn't be parsed
+    """
+    try:
+        package_files = read_package_jsons(repo_path)
+        manifest_shas = {package_file.path: package_file.sha for package_file in package_files}
+        return get_local_repo_properties(mirror_dir, repo_path), manifest_shas, collect_dependency_edges(package_files)
+    except Exception as e:
+        logger.error(f"Failed to parse {repo_path}: {e}")
+        return None
+
+
+def crawl_local_mirror(
+        driver: Driver,
+        mirror_dir: str,
+        checkpoint_store: CheckpointStore,
+        processes: Optional[int] = None,
+) -> None:
+    """
+    Build the ecosystem graph from a local directory of cloned repositories or repository tarballs.
+    The repositories are parsed in a pool of worker processes, the results are written to Neo4j by this process.
+    As for the GitHub crawl, repos whose package.json files didn't change since the last crawl are skipped, and for
+    the others only the dependency edges that changed are written.
+
+    :param driver:              Neo4j driver
+    :param mirror_dir:          Path to the local mirror (see local_mirror.find_local_repositories for the layout)
+    :param checkpoint_store:    Record of the previous crawls
+    :param processes:           Number of worker processes (default: number of CPUs)
+    """
+    repo_paths = find_local_repositories(mirror_dir)
+    logger.info(f"Found {len(repo_paths)} repositories in {mirror_dir}")
+
+    start_time = time.perf_counter()
+    processed_count = 0
+    unchanged_count = 0
+    with Pool(processes) as pool, driver.session() as session:
+        for result in pool.imap_unordered(partial(parse_local_repository, mirror_dir), repo_paths, chunksize=16):
+            if result is None:
+                continue
+            repo_properties, manifest_shas, edges = result
+            repo = LocalRepository(repo_properties['name'])
+            if manifest_shas == checkpoint_store.get_manifest_shas(repo.full_name):
+                unchanged_count += 1
+                continue
+            try:
+                previous_edges = checkpoint_store.get_dependency_edges(repo.full_name)
+                write_changed_edges(session, repo_properties, edges, previous_edges)
+                checkpoint_store.mark_processed(repo, manifest_shas, edges)
+                processed_count += 1
+            except Exception as e:
+                logger.error(f"Failed to process {repo_properties['name']}: {e}")
+
+    duration = time.perf_counter() - start_time
+    logger.info(f"Processed {processed_count} of {len(repo_paths)} repositories ({unchanged_count} unchanged) "
+                f"in {duration:.1f}s ({len(repo_paths) / duration:.1f} repositories/s)")
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="""
@@ -251,16 +362,27 @@ if __name__ == "__main__":
         Use their package.json files to create a dependency graph and store it in a Neo4j database.
         """
     )
-    parser.add_argument("--min_stars", type=int, required=True, help="Minimum number of stars a repo needs to have.")
+    parser.add_argument("--min_stars", type=int, help="Minimum number of stars a repo needs to have.")
+    parser.add_argument("--checkpoint", type=str, default="crawl-checkpoint.sqlite",
+                        help="SQLite file to keep track of the processed repos (default: crawl-checkpoint.sqlite).")
+    parser.add_argument("--local_mirror", type=str,
+                        help="Read the repos from a local directory of clones or tarballs instead of the GitHub API.")
+    parser.add_argument("--processes", type=int, help="Number of worker processes for --local_mirror (default: #CPUs).")
     args = parser.parse_args()
+    if args.local_mirror is None and args.min_stars is None:
+        parser.error("--min_stars is required unless --local_mirror is given")
 
     load_dotenv()
     driver = connect_neo4j()
-    github_token = os.getenv('GITHUB_TOKEN')
+    checkpoint_store = CheckpointStore(args.checkpoint)
 
     try:
-        crawl_github(driver, github_token, args.min_stars)
+        if args.local_mirror:
+            crawl_local_mirror(driver, args.local_mirror, checkpoint_store, args.processes)
+        else:
+            crawl_github(driver, os.getenv('GITHUB_TOKEN'), args.min_stars, checkpoint_store)
     except Exception as e:
         logger.error(f"Crawler failed: {e}")
     finally:
+        checkpoint_store.close()
         driver.close()
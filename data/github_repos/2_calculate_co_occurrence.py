@@ -1,10 +1,14 @@
 import argparse
 import logging
+from typing import Dict, Iterator, List, Tuple
 
+import numpy as np
 from dotenv import load_dotenv
-from neo4j import Driver
+from neo4j import Driver, ManagedTransaction
 from pathlib import Path
+from scipy.sparse import csr_matrix
 
+from co_occurrence_relationship import DEPENDENCY_EDGE_NAMES, get_co_occurrence_relationship
 from connect_neo4j import connect_neo4j
 from setup_logger import setup_logger
 
@@ -46,22 +50,133 @@ def process_co_occurrences(driver: Driver, query_file: str, use_batching: bool,
         logger.info(f"Created {counters.relationships_created} CO_OCCURRENCE relationships")
 
 
+def load_dependency_matrix(driver: Driver, dependency_types: List[str]) -> Tuple[csr_matrix, List[str]]:
+    """
+    Stream the repo->package dependency edges out of Neo4j into a sparse bipartite matrix.
+
+    :param driver: Neo4j driver
+    :param dependency_types: Dependency types to consider (prod, peer, dev)
+    :return: A binary (repos x packages) matrix and the package names of its columns
+    """
+    repo_indices: Dict[str, int] = {}
+    package_indices: Dict[str, int] = {}
+    rows = []
+    cols = []
+
+    with driver.session() as session:
+        result = session.run("""
+        MATCH (repo:Package)-[r]->(pkg:Package)
+        WHERE type(r) IN $edge_names
+        RETURN repo.name AS repo, pkg.name AS package
+        """, {'edge_names': [DEPENDENCY_EDGE_NAMES[dependency_type] for dependency_type in dependency_types]})
+        for record in result:
+            rows.append(repo_indices.setdefault(record['repo'], len(repo_indices)))
+            cols.append(package_indices.setdefault(record['package'], len(package_indices)))
+
+    logger.info(f"Loaded {len(rows)} dependency edges between {len(repo_indices)} repos "
+                f"and {len(package_indices)} packages")
+
+    matrix = csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (np.array(rows, dtype=np.int32), np.array(cols, dtype=np.int32))),
+        shape=(len(repo_indices), len(package_indices)),
+    )
+    # A repo can depend on a package with multiple dependency types, but it must only be counted once
+    matrix.data[:] = 1
+    return matrix, list(package_indices)
+
+
+def compute_co_occurrences(
+        dependency_matrix: csr_matrix,
+        min_occurrence_count: int,
+        block_size: int,
+) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Compute the co-occurrence counts as the sparse product of the transposed dependency matrix with itself.
+    The product is computed in blocks of packages to keep the memory bounded.
+
+    :param dependency_matrix: Binary (repos x packages) matrix
+    :param min_occurrence_count: Minimum number of occurrence for a dependency to be considered
+    :param block_size: Number of packages per block
+    :return: Generator of (target indices, connected indices, counts) per block
+    """
+    transposed = dependency_matrix.T.tocsr()
+    for start in range(0, transposed.shape[0], block_size):
+        block = (transposed[start:start + block_size] @ dependency_matrix).tocoo()
+        targets = block.row + start
+        mask = (block.data >= min_occurrence_count) & (targets != block.col)
+        yield targets[mask], block.col[mask], block.data[mask]
+
+
+def write_co_occurrences(tx: ManagedTransaction, relationship: str, rows: List[Dict]) -> int:
+    result = tx.run(f"""
+    UNWIND $rows AS row
+    MATCH (target:Package {{name: row.target}})
+    MATCH (connected:Package {{name: row.connected}})
+    MERGE (target)-[r:{relationship}]->(connected)
+    SET r.count = row.count
+    """, {'rows': rows})
+    return result.consume().counters.relationships_created
+
+
+def process_co_occurrences_sparse(
+        driver: Driver,
+        min_occurrence_count: int,
+        dependency_types: List[str],
+        block_size: int = 1_000,
+        write_batch_size: int = 10_000,
+) -> None:
+    """
+    Calculate the co-occurrences outside of Neo4j with sparse matrices and write them back in batches.
+
+    :param driver: Neo4j driver
+    :param min_occurrence_count: Minimum number of occurrence for a dependency to be considered
+    :param dependency_types: Dependency types to consider (prod, peer, dev)
+    :param block_size: Number of packages per block of the matrix product
+    :param write_batch_size: Number of relationships per write transaction
+    """
+    relationship = get_co_occurrence_relationship(dependency_types)
+    dependency_matrix, package_names = load_dependency_matrix(driver, dependency_types)
+
+    relationships_created = 0
+    with driver.session() as session:
+        session.run("CREATE INDEX package_name IF NOT EXISTS FOR (p:Package) ON (p.name)").consume()
+
+        for targets, connected, counts in compute_co_occurrences(dependency_matrix, min_occurrence_count, block_size):
+            for start in range(0, len(counts), write_batch_size):
+                end = start + write_batch_size
+                rows = [
+                    {'target': package_names[target], 'connected': package_names[other], 'count': int(count)}
+                    for target, other, count in zip(targets[start:end], connected[start:end], counts[start:end])
+                ]
+                relationships_created += session.execute_write(write_co_occurrences, relationship, rows)
+
+    logger.info(f"Created {relationships_created} {relationship} relationships")
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="""
-            Crawl GitHub for JavaScript and TypeScript repositories.
-            Use their package.json files to create a dependency graph and store it in a Neo4j database.
+            Calculate the co-occurrence of the dependencies in the Neo4j dependency graph 
+            and store it as CO_OCCURRENCE relationships.
             """
     )
     parser.add_argument("--min_occurrence", type=int, help="Minimum number of occurrence for a dependency to be considered.")
+    parser.add_argument("--engine", choices=["sparse", "cypher"], default="sparse",
+                        help="Compute the co-occurrences with sparse matrices in Python (default) or in Neo4j.")
+    parser.add_argument("--dependency_types", nargs="+", choices=list(DEPENDENCY_EDGE_NAMES),
+                        default=list(DEPENDENCY_EDGE_NAMES),
+                        help="Dependency types to consider (only for the sparse engine, default: all).")
     args = parser.parse_args()
     min_occurrence_count = args.min_occurrence if args.min_occurrence else 3
 
     load_dotenv()
     driver = connect_neo4j()
 
-    use_batching = False
-    query_file = "2_co_occurrence_batched.cypher" if use_batching else "2_co_occurrence_simple.cypher"
-    process_co_occurrences(driver, query_file, use_batching, min_occurrence_count)
+    if args.engine == "sparse":
+        process_co_occurrences_sparse(driver, min_occurrence_count, args.dependency_types)
+    else:
+        use_batching = False
+        query_file = "2_co_occurrence_batched.cypher" if use_batching else "2_co_occurrence_simple.cypher"
+        process_co_occurrences(driver, query_file, use_batching, min_occurrence_count)
 
     driver.close()
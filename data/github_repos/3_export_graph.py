@@ -0,0 +1,157 @@
+import argparse
+import json
+import os
+from typing import Dict, Iterator, List, TextIO
+
+from dotenv import load_dotenv
+from neo4j import Driver
+
+from co_occurrence_relationship import DEPENDENCY_EDGE_NAMES, get_co_occurrence_relationship
+from connect_neo4j import connect_neo4j
+from setup_logger import setup_logger
+
+logger = setup_logger(__name__)
+
+RESULT_FOLDER = "result/"
+
+
+class JsonArrayWriter:
+    """
+    Write a JSON array item by item instead of dumping a whole list at once.
+    The output is formatted like `json.dump(items, file, indent=2)`.
+    """
+
+    def __init__(self, file: TextIO):
+        self.file = file
+        self.count = 0
+
+    def __enter__(self):
+        self.file.write("[")
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.file.write("\n]" if self.count else "]")
+
+    def write(self, item: Dict) -> None:
+        separator = ",\n  " if self.count else "\n  "
+        self.file.write(separator + json.dumps(item, indent=2).replace("\n", "\n  "))
+        self.count += 1
+
+
+def stream_package_counts(driver: Driver, dependency_types: List[str], page_size: int) -> Iterator[Dict]:
+    """
+    Stream all packages with the number of repos that depend on them, page by page.
+
+    :param driver: Neo4j driver
+    :param dependency_types: Dependency types to consider (prod, peer, dev)
+    :param page_size: Number of packages per query
+    :return: Generator of { name, count } dicts, ordered by name
+    """
+    edge_names = [DEPENDENCY_EDGE_NAMES[dependency_type] for dependency_type in dependency_types]
+    after = ""
+    with driver.session() as session:
+        while True:
+            page = session.run("""
+            MATCH (pkg:Package)
+            WHERE pkg.name > $after
+            WITH pkg ORDER BY pkg.name LIMIT $page_size
+            OPTIONAL MATCH (repo:Package)-[r]->(pkg)
+            WHERE type(r) IN $edge_names
+            RETURN pkg.name AS name, count(DISTINCT repo) AS count
+            ORDER BY name
+            """, {'after': after, 'page_size': page_size, 'edge_names': edge_names}).data()
+
+            yield from page
+            if len(page) < page_size:
+                return
+            after = page[-1]['name']
+
+
+def stream_co_occurrences(driver: Driver, relationship: str, fetch_size: int) -> Iterator[Dict]:
+    """
+    Stream all co-occurrence relationships with a single query.
+    The driver fetches the records lazily in batches, so they are never all in memory. Paging with separate queries
+    would match and sort all relationships again for every page.
+    The relationships exist in both directions, so only the one from the smaller to the larger name is returned.
+
+    :param driver: Neo4j driver
+    :param relationship: Name of the co-occurrence relationship
+    :param fetch_size: Number of records the driver fetches at once
+    :return: Generator of { source, target, count } dicts
+    """
+    with driver.session(fetch_size=fetch_size) as session:
+        result = session.run(f"""
+        MATCH (source:Package)-[r:{relationship}]->(target:Package)
+        WHERE source.name < target.name
+        RETURN source.name AS source, target.name AS target, r.count AS count
+        """)
+        for record in result:
+            yield record.data()
+
+
+def export_graph(
+        driver: Driver,
+        dependency_types: List[str],
+        min_count: int,
+        output_dir: str = RESULT_FOLDER,
+        page_size: int = 10_000,
+) -> None:
+    """
+    Export the packages and their co-occurrences in the format of the Stack Overflow tags.json and tag-pairs.json,
+    so the graph can run through the same weighting, clustering and layout steps.
+    Both are streamed out of Neo4j and into the files, only the counts of the exported packages are kept in memory.
+
+    :param driver: Neo4j driver
+    :param dependency_types: Dependency types the co-occurrences were calculated for (prod, peer, dev)
+    :param min_count: Minimum number of repos that have to depend on a package for it to be exported
+    :param output_dir: Folder for the JSON files
+    :param page_size: Number of packages per query and number of co-occurrences the driver fetches at once
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    relationship = get_co_occurrence_relationship(dependency_types)
+
+    package_counts = {}
+    with open(os.path.join(output_dir, 'tags.json'), 'w') as file, JsonArrayWriter(file) as tags:
+        for package in stream_package_counts(driver, dependency_types, page_size):
+            if package['count'] >= min_count:
+                package_counts[package['name']] = package['count']
+                tags.write({"tag": package['name'], "count": package['count']})
+    logger.info(f"Number of tags: {len(package_counts)}.")
+
+    with open(os.path.join(output_dir, 'tag-pairs.json'), 'w') as file, JsonArrayWriter(file) as tag_pairs:
+        for co_occurrence in stream_co_occurrences(driver, relationship, page_size):
+            source_count = package_counts.get(co_occurrence['source'])
+            target_count = package_counts.get(co_occurrence['target'])
+            if source_count is None or target_count is None:
+                continue
+            tag_pairs.write({
+                "tag1": co_occurrence['source'],
+                "tag2": co_occurrence['target'],
+                "pairCount": co_occurrence['count'],
+                # Same normalization as in the Stack Overflow score-tag-pairs.sql
+                "pairCountNormalized": co_occurrence['count'] / (source_count + target_count),
+            })
+    logger.info(f"Number of tag-pairs: {tag_pairs.count}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="""
+            Export the packages and their co-occurrences from Neo4j as tags.json and tag-pairs.json,
+            in the same format as the Stack Overflow data.
+            """
+    )
+    parser.add_argument("--min_count", type=int, default=1,
+                        help="Minimum number of repos that have to depend on a package for it to be exported.")
+    parser.add_argument("--dependency_types", nargs="+", choices=list(DEPENDENCY_EDGE_NAMES),
+                        default=list(DEPENDENCY_EDGE_NAMES),
+                        help="Dependency types the co-occurrences were calculated for (default: all).")
+    args = parser.parse_args()
+
+    load_dotenv()
+    driver = connect_neo4j()
+
+    try:
+        export_graph(driver, args.dependency_types, args.min_count)
+    finally:
+        driver.close()
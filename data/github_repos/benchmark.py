@@ -0,0 +1,482 @@
+import argparse
+import importlib
+import json
+import re
+import resource
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from neo4j import Driver
+
+from checkpoint_store import DependencyEdge
+from co_occurrence_relationship import DEPENDENCY_EDGE_NAMES
+from connect_neo4j import connect_neo4j
+from local_mirror import LocalPackageFile
+from setup_logger import setup_logger
+
+# The pipeline scripts start with a digit, so they can't be imported with an import statement
+crawl_github = importlib.import_module("1_crawl_github")
+calculate_co_occurrence = importlib.import_module("2_calculate_co_occurrence")
+
+logger = setup_logger(__name__)
+
+DEPENDENCY_TYPE_SHARES = {'dependencies': 0.55, 'devDependencies': 0.4, 'peerDependencies': 0.05}
+MEAN_DEPENDENCY_COUNT = 12  # mean number of dependencies per package.json
+POPULARITY_EXPONENT = 1.1  # exponent of the power law (Zipf) the dependencies are drawn from
+
+SyntheticRepo = Tuple[Dict, List[LocalPackageFile]]
+
+
+@dataclass
+class StageResult:
+    scale: int
+    stage: str
+    items: int
+    unit: str
+    seconds: float
+    transactions: int
+    queries: int
+    rss_increase_mib: Optional[float]
+    rss_high_water_mib: float
+    traced_peak_mib: Optional[float]
+
+    @property
+    def throughput(self) -> float:
+        return self.items / self.seconds if self.seconds > 0 else float('inf')
+
+
+class DependencySampler:
+    """
+    Draw dependency names from a power-law popularity distribution: the package with rank r is picked with a
+    probability proportional to 1 / r^exponent, like the few huge and the many tiny packages on npm.
+    """
+
+    def __init__(self, package_count: int, exponent: float, rng: np.random.Generator):
+        weights = 1.0 / np.arange(1, package_count + 1) ** exponent
+        # Searching the cumulative distribution is much faster than rng.choice(p=...), which rebuilds it on every call
+        self.cdf = np.cumsum(weights / weights.sum())
+        self.rng = rng
+
+    def sample(self, count: int) -> Dict[str, Dict[str, str]]:
+        ranks = np.unique(np.searchsorted(self.cdf, self.rng.random(count), side='right'))
+        types = self.rng.choice(list(DEPENDENCY_TYPE_SHARES), size=len(ranks), p=list(DEPENDENCY_TYPE_SHARES.values()))
+        dependencies = {dependency_type: {} for dependency_type in DEPENDENCY_TYPE_SHARES}
+        for rank, dependency_type in zip(ranks, types):
+            dependencies[dependency_type][f"package-{rank}"] = f"^{rank % 20}.{rank % 7}.0"
+        return dependencies
+
+    def dependency_count(self) -> int:
+        return max(1, int(self.rng.poisson(MEAN_DEPENDENCY_COUNT)))
+
+
+def _package_json(path: str, content: Dict) -> LocalPackageFile:
+    return LocalPackageFile(path, json.dumps(content, indent=2).encode('utf-8'))
+
+
+def generate_monorepo(owner: str, sampler: DependencySampler, rng: np.random.Generator) -> List[LocalPackageFile]:
+    """
+    Generate the manifests of a monorepo: a workspace root (npm/yarn style or with a pnpm-workspace.yaml),
+    members that depend on each other with workspace: versions and an example that isn't part of the workspace.
+    """
+    member_count = int(rng.integers(2, 12))
+    member_names = [f"@{owner}/member-{i}" for i in range(member_count)]
+    files = []
+
+    root_dependencies = sampler.sample(sampler.dependency_count())
+    root = {'name': f"{owner}-root", 'private': True, 'devDependencies': root_dependencies['devDependencies']}
+    if rng.random() < 0.5:
+        root['workspaces'] = ['packages/*']
+    else:
+        files.append(LocalPackageFile('pnpm-workspace.yaml', b"packages:\n  - 'packages/*'\n  - '!**/test/**'\n"))
+    files.append(_package_json('package.json', root))
+
+    for i, name in enumerate(member_names):
+        manifest = {'name': name, 'version': '1.0.0', **sampler.sample(sampler.dependency_count())}
+        if i > 0:
+            manifest['dependencies'][member_names[int(rng.integers(0, i))]] = 'workspace:*'
+        files.append(_package_json(f"packages/member-{i}/package.json", manifest))
+
+    files.append(_package_json('examples/basic/package.json', {'name': 'example', **sampler.sample(3)}))
+    return files
+
+
+def generate_repositories(
+        repo_count: int,
+        package_count: int,
+        monorepo_share: float,
+        seed: int,
+) -> List[SyntheticRepo]:
+    """
+    Generate synthetic repositories with their package.json files.
+
+    :param repo_count:      Number of repositories
+    :param package_count:   Number of distinct packages the dependencies are drawn from
+    :param monorepo_share:  Share of repositories that are monorepos with workspaces
+    :param seed:            Seed of the random generator, the same seed always generates the same repositories
+    :return:                List of (repo properties, package files) tuples
+    """
+    rng = np.random.default_rng(seed)
+    sampler = DependencySampler(package_count, POPULARITY_EXPONENT, rng)
+
+    repos = []
+    for i in range(repo_count):
+        owner = f"owner-{i}"
+        if rng.random() < monorepo_share:
+            package_files = generate_monorepo(owner, sampler, rng)
+        else:
+            dependencies = sampler.sample(sampler.dependency_count())
+            package_files = [_package_json('package.json', {'name': f"repo-{i}", **dependencies})]
+        repo_properties = {
+            'name': f"{owner}/repo-{i}",
+            'stars': int(rng.pareto(1.5) * 100),
+            'last_modified': '2024-01-01T00:00:00+00:00',
+            'url': f"https://github.com/{owner}/repo-{i}",
+        }
+        repos.append((repo_properties, package_files))
+    return repos
+
+
+class InMemoryGraph:
+    """
+    Embedded stand-in for Neo4j that understands the statements of the write path (store_in_database) and of the
+    sparse co-occurrence engine. It measures the cost on the Python side and the number of round trips, but not the
+    cost inside the database. Unknown statements raise an error, so it has to be extended when the queries change.
+    """
+
+    def __init__(self):
+        self.packages: Dict[str, Dict] = {}
+        self.dependency_edges: Set[Tuple[str, str, str]] = set()
+        self.co_occurrences: Dict[Tuple[str, str, str], int] = {}
+
+    def run(self, query: str, parameters: Optional[Dict] = None) -> 'InMemoryResult':
+        parameters = parameters or {}
+        if 'CREATE INDEX' in query:
+            return InMemoryResult()
+        if 'RETURN repo.name AS repo' in query:
+            edge_names = set(parameters['edge_names'])
+            return InMemoryResult([
+                {'repo': repo, 'package': package}
+                for edge_name, repo, package in self.dependency_edges
+                if edge_name in edge_names
+            ])
+        if 'UNWIND $rows' in query:
+            relationship = re.search(r"\[r:(\w+)]", query).group(1)
+            created = 0
+            for row in parameters['rows']:
+                if row['target'] in self.packages and row['connected'] in self.packages:
+                    key = (relationship, row['target'], row['connected'])
+                    created += key not in self.co_occurrences
+                    self.co_occurrences[key] = row['count']
+            return InMemoryResult(relationships_created=created)
+        if 'repo_name' in parameters:
+            relationship = re.search(r"\[r?:(\w+)]", query).group(1)
+            edge = (relationship, parameters['repo_name'], parameters['dependency'])
+            if 'DELETE' in query:
+                self.dependency_edges.discard(edge)
+                return InMemoryResult()
+            if edge[1] in self.packages and edge[2] in self.packages and edge not in self.dependency_edges:
+                self.dependency_edges.add(edge)
+                return InMemoryResult(relationships_created=1)
+            return InMemoryResult()
+        if 'MERGE (package:Package' in query:
+            package = self.packages.setdefault(parameters['name'], {})
+            if 'properties' in parameters:
+                package.update(parameters['properties'], last_modified=parameters['last_modified'])
+            return InMemoryResult()
+        raise ValueError(f"The in-memory graph doesn't support the query:\n{query}")
+
+
+class InMemoryResult:
+    def __init__(self, records: Optional[List[Dict]] = None, relationships_created: int = 0):
+        self.records = records or []
+        self.counters = SimpleNamespace(relationships_created=relationships_created)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def data(self) -> List[Dict]:
+        return self.records
+
+    def consume(self) -> SimpleNamespace:
+        return SimpleNamespace(counters=self.counters)
+
+
+class InMemorySession:
+    def __init__(self, graph: InMemoryGraph):
+        self.graph = graph
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def run(self, query: str, parameters: Optional[Dict] = None, **kwargs) -> InMemoryResult:
+        return self.graph.run(query, parameters or kwargs.get('parameters'))
+
+    def execute_write(self, transaction_function: Callable, *args, **kwargs):
+        return transaction_function(self, *args, **kwargs)
+
+
+class InMemoryDriver:
+    def __init__(self):
+        self.graph = InMemoryGraph()
+
+    def session(self, **kwargs) -> InMemorySession:
+        return InMemorySession(self.graph)
+
+    def close(self) -> None:
+        pass
+
+
+class TransactionCounter:
+    """Count the transactions and queries that are sent through a driver."""
+
+    def __init__(self):
+        self.transactions = 0
+        self.queries = 0
+
+
+class CountingTransaction:
+    def __init__(self, transaction, counter: TransactionCounter):
+        self.transaction = transaction
+        self.counter = counter
+
+    def run(self, query: str, parameters: Optional[Dict] = None, **kwargs):
+        self.counter.queries += 1
+        return self.transaction.run(query, parameters, **kwargs)
+
+
+class CountingSession:
+    def __init__(self, session, counter: TransactionCounter):
+        self.session = session
+        self.counter = counter
+
+    def __enter__(self):
+        self.session.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return self.session.__exit__(exc_type, exc_val, exc_tb)
+
+    def run(self, query: str, parameters: Optional[Dict] = None, **kwargs):
+        # session.run() is an auto-commit transaction
+        self.counter.transactions += 1
+        self.counter.queries += 1
+        return self.session.run(query, parameters, **kwargs)
+
+    def execute_write(self, transaction_function: Callable, *args, **kwargs):
+        self.counter.transactions += 1
+        return self.session.execute_write(
+            lambda tx, *tx_args, **tx_kwargs: transaction_function(
+                CountingTransaction(tx, self.counter), *tx_args, **tx_kwargs
+            ),
+            *args, **kwargs
+        )
+
+
+class CountingDriver:
+    """Wrap a Neo4j driver (or the in-memory stand-in) to count the transactions and queries of every stage."""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.counter = TransactionCounter()
+
+    def session(self, **kwargs) -> CountingSession:
+        return CountingSession(self.driver.session(**kwargs), self.counter)
+
+    def reset_counter(self) -> None:
+        self.counter = TransactionCounter()
+
+
+def _read_memory_status_mib(field: str) -> float:
+    """Read a memory field like VmRSS (current RSS) or VmHWM (peak RSS) of /proc/self/status."""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1]) / 1024
+    raise KeyError(field)
+
+
+def _reset_peak_rss() -> bool:
+    """
+    Reset the peak RSS of the process to its current RSS, so the peak of a single stage can be measured.
+    This needs Linux (/proc/self/clear_refs). Return whether it worked.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _rss_high_water_mib() -> float:
+    # ru_maxrss is in KiB on Linux. It's the peak of the whole process so far and isn't affected by clear_refs.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@contextmanager
+def measure_stage(
+        driver: CountingDriver,
+        results: List[StageResult],
+        scale: int,
+        stage: str,
+        unit: str,
+        trace_memory: bool,
+) -> Iterator[SimpleNamespace]:
+    """
+    Measure the duration, transactions, queries and memory of a stage. Set `items` on the yielded object to the
+    number of processed items to get the throughput.
+    The memory of a stage is the increase of its peak RSS over the RSS at its start.
+    """
+    driver.reset_counter()
+    stage_info = SimpleNamespace(items=0)
+    start_rss_mib = _read_memory_status_mib('VmRSS') if _reset_peak_rss() else None
+    if trace_memory:
+        tracemalloc.start()
+    start_time = time.perf_counter()
+    yield stage_info
+    seconds = time.perf_counter() - start_time
+    rss_increase_mib = None
+    if start_rss_mib is not None:
+        rss_increase_mib = max(0.0, _read_memory_status_mib('VmHWM') - start_rss_mib)
+    traced_peak_mib = None
+    if trace_memory:
+        traced_peak_mib = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+
+    result = StageResult(scale, stage, stage_info.items, unit, seconds, driver.counter.transactions,
+                         driver.counter.queries, rss_increase_mib, _rss_high_water_mib(), traced_peak_mib)
+    results.append(result)
+    logger.info(f"[{scale} repos] {stage}: {result.items} {unit} in {seconds:.2f}s ({result.throughput:.0f} {unit}/s), "
+                f"{result.transactions} transactions, {result.queries} queries")
+
+
+def clear_graph(driver: Driver) -> None:
+    """Delete everything the benchmark wrote to Neo4j, including the index of the co-occurrence step."""
+    with driver.session() as session:
+        session.run("""
+        MATCH (package:Package)
+        CALL { WITH package DETACH DELETE package } IN TRANSACTIONS OF 10000 ROWS
+        """).consume()
+        session.run("DROP INDEX package_name IF EXISTS").consume()
+
+
+def run_scale(
+        driver: CountingDriver,
+        repo_count: int,
+        package_count: int,
+        monorepo_share: float,
+        engine: str,
+        min_occurrence_count: int,
+        seed: int,
+        trace_memory: bool,
+) -> List[StageResult]:
+    """Run all stages for one number of repositories on an empty graph."""
+    results = []
+
+    with measure_stage(driver, results, repo_count, 'generate', 'repos', trace_memory) as stage:
+        repos = generate_repositories(repo_count, package_count, monorepo_share, seed)
+        stage.items = len(repos)
+
+    with measure_stage(driver, results, repo_count, 'parse', 'manifests', trace_memory) as stage:
+        parsed_repos: List[Tuple[Dict, Set[DependencyEdge]]] = [
+            (repo_properties, crawl_github.collect_dependency_edges(package_files))
+            for repo_properties, package_files in repos
+        ]
+        stage.items = sum(len(package_files) for _, package_files in repos)
+    del repos
+
+    with measure_stage(driver, results, repo_count, 'write', 'edges', trace_memory) as stage:
+        with driver.session() as session:
+            for repo_properties, edges in parsed_repos:
+                crawl_github.store_in_database(session, repo_properties, crawl_github.to_dependencies(edges))
+                stage.items += len(edges)
+
+    with measure_stage(driver, results, repo_count, f'co-occurrence ({engine})', 'edges', trace_memory) as stage:
+        if engine == 'sparse':
+            calculate_co_occurrence.process_co_occurrences_sparse(
+                driver, min_occurrence_count, list(DEPENDENCY_EDGE_NAMES)
+            )
+        else:
+            calculate_co_occurrence.process_co_occurrences(
+                driver, "2_co_occurrence_simple.cypher", False, min_occurrence_count
+            )
+        stage.items = sum(len(edges) for _, edges in parsed_repos)
+
+    return results
+
+
+def print_report(results: List[StageResult]) -> None:
+    header = f"{'repos':>8}  {'stage':<24}{'items':>12}  {'unit':<10}{'seconds':>9}{'items/s':>12}" \
+             f"{'transactions':>14}{'queries':>10}{'RSS +MiB':>10}{'process peak MiB':>18}{'traced MiB':>12}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        rss_increase = f"{result.rss_increase_mib:.1f}" if result.rss_increase_mib is not None else "-"
+        traced = f"{result.traced_peak_mib:.1f}" if result.traced_peak_mib is not None else "-"
+        print(f"{result.scale:>8}  {result.stage:<24}{result.items:>12}  {result.unit:<10}{result.seconds:>9.2f}"
+              f"{result.throughput:>12.0f}{result.transactions:>14}{result.queries:>10}{rss_increase:>10}"
+              f"{result.rss_high_water_mib:>18.1f}{traced:>12}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="""
+        Benchmark the parse, write and co-occurrence stages on synthetic repositories of growing size.
+        Runs against an in-memory stand-in for Neo4j unless --neo4j is passed.
+        """
+    )
+    parser.add_argument("--repos", type=int, nargs="+", default=[1_000, 10_000],
+                        help="Numbers of repositories to benchmark (default: 1000 10000).")
+    parser.add_argument("--packages", type=int, default=20_000,
+                        help="Number of distinct packages the dependencies are drawn from (default: 20000).")
+    parser.add_argument("--monorepo_share", type=float, default=0.1,
+                        help="Share of the repositories that are monorepos with workspaces (default: 0.1).")
+    parser.add_argument("--min_occurrence", type=int, default=3,
+                        help="Minimum number of occurrence for a dependency to be considered (default: 3).")
+    parser.add_argument("--engine", choices=["sparse", "cypher"], default="sparse",
+                        help="Co-occurrence engine, cypher needs --neo4j (default: sparse).")
+    parser.add_argument("--neo4j", action="store_true",
+                        help="Run against the Neo4j database of the .env file. It must be empty (fresh container).")
+    parser.add_argument("--trace_memory", action="store_true",
+                        help="Also report the peak of the Python allocations per stage (slows down the stages).")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the synthetic data (default: 42).")
+    parser.add_argument("--output", type=str, help="Store the results as JSON, e.g. to compare two branches.")
+    args = parser.parse_args()
+
+    if args.engine == "cypher" and not args.neo4j:
+        parser.error("--engine=cypher needs --neo4j")
+
+    neo4j_driver = None
+    if args.neo4j:
+        load_dotenv()
+        neo4j_driver = connect_neo4j()
+        with neo4j_driver.session() as neo4j_session:
+            if neo4j_session.run("MATCH (package:Package) RETURN count(package) AS count").single()['count']:
+                neo4j_driver.close()
+                parser.error("The Neo4j database isn't empty. The benchmark clears it between runs, use a fresh one.")
+
+    all_results = []
+    try:
+        for repo_count in args.repos:
+            driver = CountingDriver(neo4j_driver if neo4j_driver else InMemoryDriver())
+            all_results.extend(run_scale(driver, repo_count, args.packages, args.monorepo_share, args.engine,
+                                         args.min_occurrence, args.seed, args.trace_memory))
+            if neo4j_driver:
+                clear_graph(neo4j_driver)
+    finally:
+        if neo4j_driver:
+            neo4j_driver.close()
+
+    print_report(all_results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump([{**asdict(result), 'throughput': result.throughput} for result in all_results], f, indent=2)
@@ -0,0 +1,131 @@
+import sqlite3
+from datetime import datetime, timezone
+from typing import Dict, Optional, Set, Tuple
+
+from github.Repository import Repository
+
+DependencyEdge = Tuple[str, str]  # (dependency type, dependency name), e.g. ('devDependencies', 'eslint')
+
+
+class CheckpointStore:
+    schema = """
+    CREATE TABLE IF NOT EXISTS repos (
+        full_name TEXT PRIMARY KEY,
+        pushed_at TEXT,
+        updated_at TEXT,
+        processed_at TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS manifests (
+        full_name TEXT NOT NULL,
+        path TEXT NOT NULL,
+        sha TEXT NOT NULL,
+        PRIMARY KEY (full_name, path)
+    );
+    CREATE TABLE IF NOT EXISTS dependency_edges (
+        full_name TEXT NOT NULL,
+        dependency_type TEXT NOT NULL,
+        dependency TEXT NOT NULL,
+        PRIMARY KEY (full_name, dependency_type, dependency)
+    );
+    """
+
+    def __init__(self, db_path: str):
+        """
+        Local SQLite record of which repositories have already been crawled.
+        For every processed repository, we store its pushed_at/updated_at timestamps, the SHAs of the package.json
+        files we saw and the dependency edges we wrote to Neo4j. With that, a later crawl can skip repositories that
+        didn't change and only write the difference of the dependency edges for those that did.
+
+        You can use it as follows:
+        ```
+        with CheckpointStore("crawl-checkpoint.sqlite") as checkpoint_store:
+            if checkpoint_store.has_repo_been_pushed(repo):
+                do_stuff(repo)
+        ```
+
+        :param db_path: Path to the SQLite database file. It is created if it doesn't exist yet.
+        """
+        self.connection = sqlite3.connect(db_path)
+        self.connection.executescript(self.schema)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    @staticmethod
+    def _to_timestamp(value: Optional[datetime]) -> Optional[str]:
+        return value.isoformat() if value else None
+
+    def _get_timestamps(self, full_name: str) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        return self.connection.execute(
+            "SELECT pushed_at, updated_at FROM repos WHERE full_name = ?", (full_name,)
+        ).fetchone()
+
+    def has_repo_been_pushed(self, repo: Repository) -> bool:
+        """
+        Check if a repository was pushed to since it was processed the last time.
+        Only a push can change its package.json files.
+        """
+        row = self._get_timestamps(repo.full_name)
+        return row is None or row[0] != self._to_timestamp(repo.pushed_at)
+
+    def has_repo_been_updated(self, repo: Repository) -> bool:
+        """
+        Check if anything about a repository changed since it was processed the last time.
+        GitHub also changes updated_at for metadata events, e.g. when the repository is starred.
+        """
+        row = self._get_timestamps(repo.full_name)
+        return row is None or row[1] != self._to_timestamp(repo.updated_at)
+
+    def get_manifest_shas(self, full_name: str) -> Dict[str, str]:
+        """Get the SHAs of the package.json files of a repository by their path."""
+        rows = self.connection.execute("SELECT path, sha FROM manifests WHERE full_name = ?", (full_name,))
+        return {path: sha for path, sha in rows}
+
+    def get_dependency_edges(self, full_name: str) -> Set[DependencyEdge]:
+        """Get the dependency edges that were written for a repository during the last crawl."""
+        rows = self.connection.execute(
+            "SELECT dependency_type, dependency FROM dependency_edges WHERE full_name = ?", (full_name,)
+        )
+        return {(dependency_type, dependency) for dependency_type, dependency in rows}
+
+    def mark_processed(
+            self,
+            repo: Repository,
+            manifest_shas: Optional[Dict[str, str]] = None,
+            dependency_edges: Optional[Set[DependencyEdge]] = None,
+    ) -> None:
+        """
+        Record that a repository was processed successfully.
+
+        :param repo:                The processed repository (or a local_mirror.LocalRepository)
+        :param manifest_shas:       SHAs of the package.json files by their path. If None, the stored SHAs are kept.
+        :param dependency_edges:    The dependency edges of the repository. If None, the stored edges are kept.
+        """
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO repos (full_name, pushed_at, updated_at, processed_at) VALUES (?, ?, ?, ?)",
+                (
+                    repo.full_name,
+                    self._to_timestamp(repo.pushed_at),
+                    self._to_timestamp(repo.updated_at),
+                    datetime.now(timezone.utc).isoformat(),
+                )
+            )
+            if manifest_shas is not None:
+                self.connection.execute("DELETE FROM manifests WHERE full_name = ?", (repo.full_name,))
+                self.connection.executemany(
+                    "INSERT INTO manifests (full_name, path, sha) VALUES (?, ?, ?)",
+                    [(repo.full_name, path, sha) for path, sha in manifest_shas.items()]
+                )
+            if dependency_edges is not None:
+                self.connection.execute("DELETE FROM dependency_edges WHERE full_name = ?", (repo.full_name,))
+                self.connection.executemany(
+                    "INSERT INTO dependency_edges (full_name, dependency_type, dependency) VALUES (?, ?, ?)",
+                    [(repo.full_name, dependency_type, dependency) for dependency_type, dependency in dependency_edges]
+                )
@@ -0,0 +1,17 @@
+from typing import List
+
+DEPENDENCY_EDGE_NAMES = {
+    'prod': 'PROD_DEPENDENCY',
+    'peer': 'PEER_DEPENDENCY',
+    'dev': 'DEV_DEPENDENCY',
+}
+
+
+def get_co_occurrence_relationship(dependency_types: List[str]) -> str:
+    """
+    Get the name of the co-occurrence relationship for a selection of dependency types.
+    If all types are selected, this is CO_OCCURRENCE. Otherwise, the types are appended, e.g. CO_OCCURRENCE_DEV_PROD.
+    """
+    if set(dependency_types) == set(DEPENDENCY_EDGE_NAMES):
+        return "CO_OCCURRENCE"
+    return "CO_OCCURRENCE_" + "_".join(sorted(dependency_type.upper() for dependency_type in set(dependency_types)))
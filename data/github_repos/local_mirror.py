@@ -0,0 +1,137 @@
+import hashlib
+import os
+import posixpath
+import tarfile
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from manifest import MANIFEST_FILE_NAMES
+
+TARBALL_SUFFIXES = ('.tar.gz', '.tgz', '.tar')
+IGNORED_DIRECTORIES = ('.git', 'node_modules')
+
+
+@dataclass
+class LocalPackageFile:
+    """
+    A package.json (or pnpm-workspace.yaml) file read from a local clone or tarball.
+    It provides the attributes of github.ContentFile.ContentFile the crawler uses, so it can be processed the same way.
+    """
+    path: str
+    decoded_content: bytes
+
+    @property
+    def name(self) -> str:
+        return posixpath.basename(self.path)
+
+    @property
+    def sha(self) -> str:
+        """The git blob SHA of the file, i.e. the same SHA the GitHub API returns for it."""
+        header = f"blob {len(self.decoded_content)}\0".encode('utf-8')
+        return hashlib.sha1(header + self.decoded_content).hexdigest()
+
+
+@dataclass
+class LocalRepository:
+    """
+    A repository of the local mirror with the attributes of github.Repository.Repository the CheckpointStore uses.
+    A mirror has no push timestamps, so its repos are compared by the SHAs of their package.json files only.
+    """
+    full_name: str
+    pushed_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+def is_tarball(path: str) -> bool:
+    return path.endswith(TARBALL_SUFFIXES)
+
+
+def find_local_repositories(mirror_dir: str) -> List[str]:
+    """
+    Find all repositories in a local mirror directory.
+    The mirror is expected to have the layout `<mirror_dir>/<owner>/<repo>`, where `<repo>` is either a cloned
+    repository or a tarball of it (e.g. `<mirror_dir>/facebook/react.tar.gz`).
+
+    :param mirror_dir:  Path to the local mirror
+    :return:            Sorted paths of all repositories in the mirror
+    """
+    repositories = []
+    for owner in sorted(os.scandir(mirror_dir), key=lambda entry: entry.name):
+        if not owner.is_dir():
+            continue
+        for repo in sorted(os.scandir(owner.path), key=lambda entry: entry.name):
+            if repo.is_dir() or (repo.is_file() and is_tarball(repo.name)):
+                repositories.append(repo.path)
+    return repositories
+
+
+def get_repo_name(mirror_dir: str, repo_path: str) -> str:
+    """Get the full name of a repository in the mirror (e.g. facebook/react), analogous to the GitHub full_name."""
+    relative_path = Path(os.path.relpath(repo_path, mirror_dir)).as_posix()
+    for suffix in TARBALL_SUFFIXES:
+        if relative_path.endswith(suffix):
+            return relative_path[:-len(suffix)]
+    return relative_path
+
+
+def get_local_repo_properties(mirror_dir: str, repo_path: str) -> Dict:
+    """Get the properties of the repo node of a repository in the mirror."""
+    return {
+        'name': get_repo_name(mirror_dir, repo_path),
+        'last_modified': datetime.fromtimestamp(os.path.getmtime(repo_path), tz=timezone.utc).isoformat(),
+        'url': Path(repo_path).resolve().as_uri(),
+    }
+
+
+def _is_within_depth(path: str, max_depth: int) -> bool:
+    parts = path.split('/')
+    return len(parts) - 1 <= max_depth and not any(part in IGNORED_DIRECTORIES for part in parts[:-1])
+
+
+def _read_package_jsons_from_directory(repo_path: str, max_depth: int) -> List[LocalPackageFile]:
+    package_files = []
+    for directory, subdirectories, files in os.walk(repo_path):
+        relative_directory = Path(os.path.relpath(directory, repo_path)).as_posix()
+        depth = 0 if relative_directory == '.' else relative_directory.count('/') + 1
+        # Prune the walk instead of filtering the results, so we don't traverse the whole tree
+        subdirectories[:] = [] if depth >= max_depth else sorted(
+            subdirectory for subdirectory in subdirectories if subdirectory not in IGNORED_DIRECTORIES
+        )
+        for file_name in sorted(set(files).intersection(MANIFEST_FILE_NAMES)):
+            path = file_name if depth == 0 else f"{relative_directory}/{file_name}"
+            with open(os.path.join(directory, file_name), 'rb') as file:
+                package_files.append(LocalPackageFile(path, file.read()))
+    return package_files
+
+
+def _read_package_jsons_from_tarball(repo_path: str, max_depth: int) -> List[LocalPackageFile]:
+    with tarfile.open(repo_path, 'r:*') as tarball:
+        members = tarball.getmembers()
+        # Tarballs downloaded from GitHub contain a single top-level directory (<owner>-<repo>-<sha>/)
+        top_level_names = {member.name.split('/', 1)[0] for member in members}
+        strip_prefix = len(top_level_names) == 1 and all('/' in member.name or member.isdir() for member in members)
+
+        package_files = []
+        for member in members:
+            path = member.name.split('/', 1)[1] if strip_prefix and '/' in member.name else member.name
+            is_manifest = posixpath.basename(path) in MANIFEST_FILE_NAMES
+            if member.isfile() and is_manifest and _is_within_depth(path, max_depth):
+                package_files.append(LocalPackageFile(path, tarball.extractfile(member).read()))
+    return sorted(package_files, key=lambda package_file: package_file.path)
+
+
+def read_package_jsons(repo_path: str, max_depth: int = 3) -> List[LocalPackageFile]:
+    """
+    Find and read all package.json and pnpm-workspace.yaml files of a local repository (clone or tarball).
+    Like the GitHub crawler, it only searches up to `max_depth` directories deep. In contrast to it, `.git` and
+    `node_modules` directories are skipped since local clones might have their dependencies installed.
+
+    :param repo_path:   Path to the cloned repository or its tarball
+    :param max_depth:   Maximum directory depth to search
+    :return:            The package.json files of the repository
+    """
+    if is_tarball(repo_path):
+        return _read_package_jsons_from_tarball(repo_path, max_depth)
+    return _read_package_jsons_from_directory(repo_path, max_depth)
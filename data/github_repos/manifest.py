@@ -0,0 +1,213 @@
+import json
+import posixpath
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Protocol
+
+from setup_logger import setup_logger
+
+logger = setup_logger(__name__)
+
+DEPENDENCY_TYPES = ('dependencies', 'peerDependencies', 'devDependencies')
+MANIFEST_FILE_NAMES = ('package.json', 'pnpm-workspace.yaml')
+# Version specs that point to a package inside the repository instead of the npm registry
+LOCAL_VERSION_PREFIXES = ('file:', 'link:', 'workspace:', 'portal:')
+
+
+class ManifestFile(Protocol):
+    """The attributes we need from a github.ContentFile.ContentFile or a local_mirror.LocalPackageFile."""
+    path: str
+    decoded_content: bytes
+
+
+@dataclass
+class Manifest:
+    """A package.json file, decoded exactly once."""
+    path: str
+    name: Optional[str]
+    dependencies: Dict[str, Dict[str, str]]
+    workspaces: List[str] = field(default_factory=list)
+
+    @property
+    def directory(self) -> str:
+        return posixpath.dirname(self.path)
+
+    @classmethod
+    def from_file(cls, file: ManifestFile) -> Optional['Manifest']:
+        """Decode a package.json file. Return None if it isn't valid JSON."""
+        try:
+            data = json.loads(file.decoded_content.decode('utf-8'))
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            logger.warning(f"Could not parse {file.path}: {e}")
+            return None
+        if not isinstance(data, dict):
+            logger.warning(f"Could not parse {file.path}: not a JSON object")
+            return None
+
+        # npm, yarn and bun use a list of globs, yarn additionally supports { packages: [...], nohoist: [...] }.
+        # Anything else (null, a single string, ...) is treated as no workspaces.
+        workspaces = data.get('workspaces')
+        if isinstance(workspaces, dict):
+            workspaces = workspaces.get('packages')
+        if not isinstance(workspaces, list):
+            workspaces = []
+
+        return cls(
+            path=file.path.lstrip('/'),
+            name=data.get('name') if isinstance(data.get('name'), str) else None,
+            dependencies={
+                dependency_type: data.get(dependency_type) if isinstance(data.get(dependency_type), dict) else {}
+                for dependency_type in DEPENDENCY_TYPES
+            },
+            workspaces=[pattern for pattern in workspaces if isinstance(pattern, str)],
+        )
+
+    @property
+    def is_workspace_root(self) -> bool:
+        return len(self.workspaces) > 0
+
+
+def parse_pnpm_workspace(content: str) -> List[str]:
+    """
+    Extract the workspace globs from a pnpm-workspace.yaml file.
+    Only the `packages` list is read, so we get away without a YAML parser.
+    """
+    patterns = []
+    in_packages = False
+    for line in content.splitlines():
+        stripped = line.split('#', 1)[0].strip()
+        if not stripped:
+            continue
+        if not line[0].isspace() and not stripped.startswith('-'):
+            key, _, value = stripped.partition(':')
+            in_packages = key.strip() == 'packages'
+            # Flow style, e.g. packages: ['packages/*', 'apps/*']
+            if in_packages and value.strip().startswith('['):
+                patterns.extend(item.strip().strip('\'"') for item in value.strip()[1:-1].split(',') if item.strip())
+                in_packages = False
+        elif in_packages and stripped.startswith('-'):
+            patterns.append(stripped[1:].strip().strip('\'"'))
+    return patterns
+
+
+def _glob_to_regex(pattern: str) -> re.Pattern:
+    pattern = pattern.strip().removeprefix('./').rstrip('/')
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('/**', i) and i + 3 == len(pattern):
+            # A trailing /** also matches the directory itself
+            regex += '(?:/.*)?'
+            i += 3
+        elif pattern.startswith('**/', i):
+            regex += '(?:[^/]+/)*'
+            i += 3
+        elif pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+        elif pattern[i] == '*':
+            regex += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            regex += '[^/]'
+            i += 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return re.compile(regex)
+
+
+def resolve_workspace_members(root: Manifest, manifests: List[Manifest]) -> List[Manifest]:
+    """
+    Resolve the workspace globs of a root manifest to the manifests of its members.
+    Globs starting with "!" exclude directories, as in pnpm.
+    """
+    includes = [_glob_to_regex(pattern) for pattern in root.workspaces if not pattern.startswith('!')]
+    excludes = [_glob_to_regex(pattern[1:]) for pattern in root.workspaces if pattern.startswith('!')]
+
+    members = []
+    for manifest in manifests:
+        if manifest is root:
+            continue
+        relative_directory = posixpath.relpath(manifest.directory or '.', root.directory or '.')
+        if relative_directory.startswith('..'):
+            continue
+        if any(regex.fullmatch(relative_directory) for regex in includes) and \
+                not any(regex.fullmatch(relative_directory) for regex in excludes):
+            members.append(manifest)
+    return members
+
+
+def extract_repo_dependencies(files: List[ManifestFile]) -> Dict[str, Dict[str, str]]:
+    """
+    Take all manifest files of a repository and return its deduplicated dependencies.
+
+    - Every package.json is decoded once.
+    - Workspace roots are the package.json files with a `workspaces` field or next to a pnpm-workspace.yaml.
+      Their globs are resolved to the member packages; package.json files that don't belong to the workspace
+      (e.g. examples or test fixtures) are ignored. The devDependencies of the root are added to the repository.
+    - If there is no workspace root, every package.json counts.
+    - Dependencies on packages of the repository itself (by the name of a workspace root or member or with a
+      file:/link:/workspace: version) are skipped.
+
+    :param files:   The package.json and pnpm-workspace.yaml files of a repository
+    :return:        A dictionary of dependencies by type, e.g. { dependencies: { lodash: 1.3.0 } }
+    """
+    manifests = []
+    pnpm_workspaces = {}
+    for file in files:
+        if posixpath.basename(file.path) == 'pnpm-workspace.yaml':
+            try:
+                pnpm_workspaces[posixpath.dirname(file.path.lstrip('/'))] = \
+                    parse_pnpm_workspace(file.decoded_content.decode('utf-8'))
+            except UnicodeDecodeError as e:
+                logger.warning(f"Could not parse {file.path}: {e}")
+        else:
+            manifest = Manifest.from_file(file)
+            if manifest:
+                manifests.append(manifest)
+
+    for manifest in manifests:
+        manifest.workspaces.extend(pnpm_workspaces.get(manifest.directory, []))
+
+    included = []
+    root_dev_dependencies = []
+    # Only workspace roots and members can be referenced by name. Without a workspace, a dependency on a name is
+    # resolved from the registry, even if e.g. a test fixture in the repo has the same name.
+    internal_names = set()
+    roots = [manifest for manifest in manifests if manifest.is_workspace_root]
+    if roots:
+        for root in roots:
+            members = resolve_workspace_members(root, manifests)
+            if members:
+                included.extend(members)
+                root_dev_dependencies.append(root.dependencies['devDependencies'])
+                internal_names.update(manifest.name for manifest in [root, *members] if manifest.name)
+            else:
+                # The globs didn't match anything we found, so the root is treated like a regular package
+                included.append(root)
+    else:
+        included = manifests
+
+    def is_external(name: str, version: str) -> bool:
+        is_local_version = isinstance(version, str) and version.startswith(LOCAL_VERSION_PREFIXES)
+        return name not in internal_names and not is_local_version
+
+    dependencies = {dependency_type: {} for dependency_type in DEPENDENCY_TYPES}
+    seen = set()
+    for manifest in included:
+        # A nested workspace root can be a member of another root. Count every manifest only once.
+        if manifest.path in seen:
+            continue
+        seen.add(manifest.path)
+        for dependency_type in DEPENDENCY_TYPES:
+            for name, version in manifest.dependencies[dependency_type].items():
+                if is_external(name, version):
+                    dependencies[dependency_type].setdefault(name, version)
+
+    for dev_dependencies in root_dev_dependencies:
+        for name, version in dev_dependencies.items():
+            if is_external(name, version):
+                dependencies['devDependencies'].setdefault(name, version)
+
+    return dependencies
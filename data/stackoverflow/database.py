@@ -0,0 +1,163 @@
+import atexit
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence
+
+import psycopg
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import ConnectionPool
+
+from stackoverflow.config import POSTGRES_CONFIG
+
+POOL_MAX_SIZE = 8
+BATCH_SIZE = 10_000
+
+# Session settings per pipeline stage, see https://www.postgresql.org/docs/current/runtime-config.html
+STAGE_SETTINGS = {
+    # Bulk inserts: we can re-run the stage if the server crashes, so don't wait for the WAL to be flushed
+    'load': {
+        'synchronous_commit': 'off',
+    },
+    'synonyms': {
+        'synchronous_commit': 'off',
+    },
+    # Large sequential scans, sorts and hash joins
+    'post_tags': {
+        'work_mem': '256MB',
+        'maintenance_work_mem': '1GB',
+        'max_parallel_workers_per_gather': '4',
+        'max_parallel_maintenance_workers': '4',
+    },
+    'filter': {
+        'work_mem': '256MB',
+        'max_parallel_workers_per_gather': '4',
+    },
+    'score': {
+        'work_mem': '1GB',
+        'max_parallel_workers_per_gather': '8',
+    },
+    # Many of these run at the same time, so they get their parallelism from the partitions instead of from workers
+    'score_partition': {
+        'work_mem': '256MB',
+        'max_parallel_workers_per_gather': '0',
+        'synchronous_commit': 'off',
+    },
+    'export': {
+        'work_mem': '256MB',
+        'max_parallel_workers_per_gather': '4',
+    },
+}
+
+_pool: Optional[ConnectionPool] = None
+
+
+def _reset_connection(conn: psycopg.Connection) -> None:
+    """Undo the session settings of a stage before the connection goes back to the pool."""
+    conn.autocommit = True
+    conn.execute("RESET ALL")
+    conn.autocommit = False
+
+
+def get_pool() -> ConnectionPool:
+    """Get the connection pool shared by all database access of this process. It's created on the first call."""
+    global _pool
+    if _pool is None:
+        _pool = ConnectionPool(
+            make_conninfo(**{key: value for key, value in POSTGRES_CONFIG.items() if value is not None}),
+            min_size=1,
+            max_size=POOL_MAX_SIZE,
+            reset=_reset_connection,
+            open=True,
+        )
+        atexit.register(close_pool)
+    return _pool
+
+
+def close_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
+
+@contextmanager
+def connection(stage: Optional[str] = None, autocommit: bool = False) -> Iterator[psycopg.Connection]:
+    """
+    Borrow a connection from the pool and apply the session settings of a pipeline stage.
+    Without autocommit, the transaction is committed when the block exits (or rolled back on an exception).
+
+    You can use it as follows:
+    ```
+    with connection('export') as conn:
+        rows = conn.execute("SELECT ...").fetchall()
+    ```
+
+    :param stage:       Pipeline stage, one of the keys of STAGE_SETTINGS
+    :param autocommit:  Whether to run every statement in its own transaction
+    """
+    with get_pool().connection() as conn:
+        conn.autocommit = autocommit
+        for name, value in STAGE_SETTINGS.get(stage, {}).items():
+            # set_config(..., false) instead of SET, so the value can be passed as a parameter
+            conn.execute("SELECT set_config(%s, %s, false)", (name, value))
+        if not autocommit:
+            conn.commit()
+        yield conn
+
+
+def _execute_batch(
+        conn: psycopg.Connection,
+        query: str,
+        batch: List[Sequence],
+        on_error: Optional[Callable[[Sequence, psycopg.Error], None]],
+) -> None:
+    try:
+        with conn.cursor() as cur:
+            cur.executemany(query, batch)
+        conn.commit()
+    except psycopg.Error:
+        if on_error is None:
+            raise
+        conn.rollback()
+        # Retry the batch row by row, every row in its own savepoint, to skip only the failing rows
+        with conn.cursor() as cur:
+            for row in batch:
+                try:
+                    with conn.transaction():
+                        cur.execute(query, row)
+                except psycopg.Error as e:
+                    on_error(row, e)
+        conn.commit()
+
+
+def execute_batched(
+        conn: psycopg.Connection,
+        query: str,
+        rows: Iterable[Sequence],
+        batch_size: int = BATCH_SIZE,
+        on_error: Optional[Callable[[Sequence, psycopg.Error], None]] = None,
+) -> int:
+    """
+    Execute a statement for many rows with as few round trips as possible.
+    The rows are sent in batches with executemany, which psycopg runs as a prepared statement in pipeline mode.
+    Every batch is committed on its own.
+
+    :param conn:        Database connection (without autocommit)
+    :param query:       Statement with placeholders, e.g. INSERT INTO Tags (Id, TagName) VALUES (%s, %s)
+    :param rows:        Parameters for the statement, one sequence per row
+    :param batch_size:  Number of rows per batch
+    :param on_error:    If given, a failing batch is retried row by row and this is called for every failing row.
+                        Otherwise, the error is raised.
+    :return:            Number of rows that were sent
+    """
+    count = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            _execute_batch(conn, query, batch, on_error)
+            count += len(batch)
+            batch = []
+    if batch:
+        _execute_batch(conn, query, batch, on_error)
+        count += len(batch)
+    return count
@@ -1,33 +1,28 @@
-import psycopg
 import json
 
-from stackoverflow.config import POSTGRES_CONFIG
+from stackoverflow.database import connection
 
 TAG_COUNT_THRESHOLD = 5000
 
 
 def export_data():
-    conn = psycopg.connect(**POSTGRES_CONFIG)
-    cur = conn.cursor()
-
     print("Exporting tag and tag-pair count and score data from database...")
 
-    sql_file = open('resolve-tags.sql', 'r')
-    cur.execute(sql_file.read())
-    resolved_tags = [{"tag": row[0], "count": row[1]} for row in cur.fetchall()]
-
-    # Select all tag pairs
-    cur.execute("SELECT Tag1, Tag2, PairCount, NormalizedScore FROM TagPairScores")
-    tag_pairs = [{
-        "tag1": row[0],
-        "tag2": row[1],
-        "pairCount": row[2],
-        "pairCountNormalized": row[3]
-    } for row in cur.fetchall()]
-
-    # Close the database connection
-    cur.close()
-    conn.close()
+    with open('resolve-tags.sql', 'r') as sql_file:
+        resolve_tags_query = sql_file.read()
+
+    with connection('export') as conn:
+        cur = conn.execute(resolve_tags_query)
+        resolved_tags = [{"tag": row[0], "count": row[1]} for row in cur.fetchall()]
+
+        # Select all tag pairs
+        cur = conn.execute("SELECT Tag1, Tag2, PairCount, NormalizedScore FROM TagPairScores")
+        tag_pairs = [{
+            "tag1": row[0],
+            "tag2": row[1],
+            "pairCount": row[2],
+            "pairCountNormalized": row[3]
+        } for row in cur.fetchall()]
 
     # Filter the data according to the count threshold
     resolved_tags = [tag for tag in resolved_tags if tag['count'] > TAG_COUNT_THRESHOLD]
@@ -1,16 +1,13 @@
-import psycopg
-
-from stackoverflow.config import POSTGRES_CONFIG
+from stackoverflow.database import connection
 
 
 def filter_posts() -> None:
-    conn = psycopg.connect(**POSTGRES_CONFIG, autocommit=True)
-    cur = conn.cursor()
-
-    sql_file = open('filter-posts.sql', 'r')
+    with open('filter-posts.sql', 'r') as sql_file:
+        query = sql_file.read()
 
     print("Generating table with filtered posts...")
-    cur.execute(sql_file.read())
+    with connection('filter', autocommit=True) as conn:
+        conn.execute(query)
 
 
 if __name__ == "__main__":
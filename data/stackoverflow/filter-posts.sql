@@ -14,3 +14,6 @@ CREATE TABLE FilteredPosts AS
                    LastActivityDate >= '2018-01-01' AND
                    Score >= -1 AND
                    ClosedDate IS NULL;
+
+-- The id ranges of the partitioned tag-pair scoring are looked up by the primary key
+ALTER TABLE FilteredPosts ADD PRIMARY KEY (Id);
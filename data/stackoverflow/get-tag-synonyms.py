@@ -1,9 +1,9 @@
-from typing import TypedDict, List
+from typing import TypedDict, List, Set
 
 import requests
 import psycopg
 
-from stackoverflow.config import POSTGRES_CONFIG
+from stackoverflow.database import connection, execute_batched
 
 
 # StackExchange API parameters
@@ -47,17 +47,15 @@ def fetch_all_tag_synonyms() -> List[TagSynonymMapping]:
     return synonyms
 
 
-# Example function to get a tag ID given its name
-def _get_tag_id(cur: psycopg.Cursor, tag_name: str) -> int | None:
+def _get_existing_tags(conn: psycopg.Connection, tag_names: List[str]) -> Set[str]:
     """
-    Get the id of a tag from the database by the tags' name.
-    :param cur:         psycopg database cursor
-    :param tag_name:    The name of the tag
-    :return:            The id if the tag was found, otherwise None.
+    Get the subset of tag names that exist in the database, with a single query.
+    :param conn:        psycopg database connection
+    :param tag_names:   The names of the tags
+    :return:            The names of the tags that were found.
     """
-    cur.execute("SELECT Id FROM Tags WHERE TagName = %s", (tag_name,))
-    result = cur.fetchone()
-    return result[0] if result else None
+    cur = conn.execute("SELECT TagName FROM Tags WHERE TagName = ANY(%s)", (tag_names,))
+    return {row[0] for row in cur.fetchall()}
 
 
 def store_tag_synonyms(synonyms: List[TagSynonymMapping]) -> None:
@@ -68,43 +66,52 @@ def store_tag_synonyms(synonyms: List[TagSynonymMapping]) -> None:
     """
 
     print("Storing tag synonyms in database...")
-    conn = psycopg.connect(**POSTGRES_CONFIG)
-    cur = conn.cursor()
-
-    # Ensure the TagSynonyms table exists
-    cur.execute("""
-            CREATE TABLE IF NOT EXISTS TagSynonyms (
-                PrimaryTag TEXT,
-                SynonymTag TEXT
-            );
-        """)
-    conn.commit()
-
-    for synonym in synonyms:
-        primary_tag = synonym['to_tag']
-        synonym_tag = synonym['from_tag']
-        primary_tag_id = _get_tag_id(cur, primary_tag)
-        synonym_tag_id = _get_tag_id(cur, synonym_tag)
-
-        if primary_tag_id and synonym_tag_id:  # only insert the mapping pair if both tags exist in the Tags table
-            try:
-                cur.execute(
-                    "INSERT INTO TagSynonyms (PrimaryTag, SynonymTag) VALUES (%s, %s) ON CONFLICT DO NOTHING",
-                    (primary_tag, synonym_tag)
-                )
-            except psycopg.Error as e:
-                print(f"Error inserting synonym {synonym}: {e}")
-        else:
-            if not primary_tag_id:
-                print(f"Tag not found in Tags table: {primary_tag}")
-            if not synonym_tag_id:
-                print(f"Tag not found in Tags table: {synonym_tag}")
-    conn.commit()
-
-    cur.close()
-    conn.close()
+    with connection('synonyms') as conn:
+        # Ensure the TagSynonyms table exists
+        conn.execute("""
+                CREATE TABLE IF NOT EXISTS TagSynonyms (
+                    PrimaryTag TEXT,
+                    SynonymTag TEXT
+                );
+            """)
+        conn.commit()
+
+        existing_tags = _get_existing_tags(
+            conn, list({tag for synonym in synonyms for tag in (synonym['to_tag'], synonym['from_tag'])})
+        )
+
+        rows = []
+        for synonym in synonyms:
+            primary_tag = synonym['to_tag']
+            synonym_tag = synonym['from_tag']
+
+            # only insert the mapping pair if both tags exist in the Tags table
+            if primary_tag in existing_tags and synonym_tag in existing_tags:
+                rows.append((primary_tag, synonym_tag))
+            else:
+                if primary_tag not in existing_tags:
+                    print(f"Tag not found in Tags table: {primary_tag}")
+                if synonym_tag not in existing_tags:
+                    print(f"Tag not found in Tags table: {synonym_tag}")
+
+        execute_batched(
+            conn,
+            "INSERT INTO TagSynonyms (PrimaryTag, SynonymTag) VALUES (%s, %s) ON CONFLICT DO NOTHING",
+            rows,
+            on_error=lambda row, e: print(f"Error inserting synonym {row}: {e}"),
+        )
+
+
+def resolve_post_tag_synonyms() -> None:
+    """Replace the synonym tags in the PostTags table with their primary tags."""
+    print("Resolving tag synonyms in the post tags...")
+    with open('resolve-post-tag-synonyms.sql', 'r') as sql_file:
+        query = sql_file.read()
+    with connection('post_tags', autocommit=True) as conn:
+        conn.execute(query)
 
 
 if __name__ == "__main__":
     synonyms_from_api = fetch_all_tag_synonyms()
     store_tag_synonyms(synonyms_from_api)
+    resolve_post_tag_synonyms()
@@ -5,10 +5,11 @@ from collections.abc import KeysView
 
 import psycopg
 
-from stackoverflow.config import POSTGRES_CONFIG
+from stackoverflow.database import connection, execute_batched
 from download import DOWNLOAD_FOLDER
 
 LOGFILE_PATH = "/tmp/load-into-db.log"
+POST_TAGS_SQL_FILES = ('post-tags.sql', 'resolve-post-tag-synonyms.sql')
 
 TABLE_SCHEMAS = {
     'Posts': {
@@ -61,11 +62,34 @@ TABLE_SCHEMAS = {
 }
 
 
+def _parse_rows(tree, columns: list, column_types: dict, table_name: str):
+    """Generate the rows of an XML file as tuples with a value (or None) for every column of the table."""
+    count = 0
+    for events, row in tree:
+        try:
+            if row.attrib.values():
+                yield tuple(
+                    None if (val := row.attrib.get(column)) is None
+                    else int(val) if column_types[column] in ['INTEGER', 'BOOLEAN']
+                    else val
+                    for column in columns
+                )
+
+                count += 1
+                if count % 10000 == 0:
+                    print(f"{table_name} total rows: {count}")
+
+        except Exception as e:
+            logging.warning(e)
+            print(f"Error while adding rows to table {table_name}:\n{e}")
+        finally:
+            row.clear()
+
+
 def load_files_into_db(
         file_names: KeysView,
         table_schemas: dict,
         directory: str,
-        database_params: dict,
         log_filename=LOGFILE_PATH
 ) -> None:
     """
@@ -76,7 +100,6 @@ def load_files_into_db(
     :param file_names:          Names of the XML files without the .xml file ending
     :param table_schemas:       SQL schemas the respective tables
     :param directory:           Path to the downloaded XML files
-    :param database_params:     Dictionary with database connection parameters
     :param log_filename:        Filename for the log file
     """
     create_query = 'CREATE TABLE IF NOT EXISTS {table} ({fields})'
@@ -84,59 +107,60 @@ def load_files_into_db(
 
     logging.basicConfig(filename=os.path.join(directory, log_filename), level=logging.INFO)
 
+    def log_row_error(row, e):
+        logging.warning(e)
+        print(f"Error while adding row {row[0]}:\n{e}")
+
     try:
-        conn = psycopg.connect(**database_params)
-    except Exception as e:
+        with connection('load') as conn:
+            for file in file_names:
+                print("Opening {0}.xml".format(file))
+                with open(os.path.join(directory, file + '.xml')) as xml_file:
+                    tree = etree.iterparse(xml_file)
+                    table_name = file
+
+                    fields_definitions = ", ".join([f'{name} {type}' for name, type in table_schemas[table_name].items()])
+                    sql_create = create_query.format(table=table_name, fields=fields_definitions)
+                    print(f'Creating table {table_name}')
+
+                    try:
+                        logging.info(sql_create)
+                        conn.execute(sql_create)
+                        conn.commit()
+                    except Exception as e:
+                        conn.rollback()
+                        logging.warning(e)
+                        print(f"Error while creating table {table_name}:\n{e}")
+
+                    # All rows are inserted with the same statement (missing attributes are NULL),
+                    # so they can be sent in batches as one prepared statement
+                    columns = list(table_schemas[table_name].keys())
+                    query = insert_query.format(
+                        table=table_name, columns=', '.join(columns), values=', '.join(['%s'] * len(columns))
+                    )
+                    rows = _parse_rows(tree, columns, table_schemas[table_name], table_name)
+                    execute_batched(conn, query, rows, on_error=log_row_error)
+
+                    del tree
+    except psycopg.OperationalError as e:
         logging.error(e)
         print(f"Unable to connect to the database:\n{e}")
-        return
-
-    cur = conn.cursor()
-    for file in file_names:
-        print("Opening {0}.xml".format(file))
-        with open(os.path.join(directory, file + '.xml')) as xml_file:
-            tree = etree.iterparse(xml_file)
-            table_name = file
-
-            fields_definitions = ", ".join([f'{name} {type}' for name, type in table_schemas[table_name].items()])
-            sql_create = create_query.format(table=table_name, fields=fields_definitions)
-            print(f'Creating table {table_name}')
-
-            try:
-                logging.info(sql_create)
-                cur.execute(sql_create)
-            except Exception as e:
-                logging.warning(e)
-                print(f"Error while creating table {table_name}:\n{e}")
-
-            count = 0
-            for events, row in tree:
-                try:
-                    if row.attrib.values():
-                        columns = ', '.join(row.attrib.keys())
-                        placeholders = ', '.join(['%s'] * len(row.attrib.keys()))
-                        query = insert_query.format(table=table_name, columns=columns, values=placeholders)
-                        vals = [val if table_schemas[table_name][key] not in ['INTEGER', 'BOOLEAN'] else int(val) for
-                                key, val in row.attrib.items()]
-                        cur.execute(query, vals)
-
-                        count += 1
-                        if count % 10000 == 0:
-                            print(f"{table_name} total rows: {count}")
-                            conn.commit()
-
-                except Exception as e:
-                    logging.warning(e)
-                    print(f"Error while adding rows to table {table_name}:\n{e}")
-                finally:
-                    row.clear()
-
-            conn.commit()
-            del tree
-
-    cur.close()
-    conn.close()
+
+
+def create_post_tags_table(sql_files: tuple = POST_TAGS_SQL_FILES) -> None:
+    """
+    Create the normalized PostTags table (post id, tag id) from the loaded Posts and Tags tables.
+    This way, the tags of the posts are split up once at ingest time instead of in every query that uses them.
+
+    :param sql_files:   SQL scripts that create the table and resolve the tag synonyms
+    """
+    print("Generating table with normalized post tags...")
+    with connection('post_tags', autocommit=True) as conn:
+        for sql_file in sql_files:
+            with open(sql_file, 'r') as file:
+                conn.execute(file.read())
 
 
 if __name__ == '__main__':
-    load_files_into_db(TABLE_SCHEMAS.keys(), TABLE_SCHEMAS, DOWNLOAD_FOLDER, POSTGRES_CONFIG)
+    load_files_into_db(TABLE_SCHEMAS.keys(), TABLE_SCHEMAS, DOWNLOAD_FOLDER)
+    create_post_tags_table()
@@ -0,0 +1,43 @@
+/*
+This SQL script merges the partial tag-pair counts of all partitions into the table TagPairScores and normalizes them,
+in the same way as score-tag-pairs.sql does for the non-partitioned counts.
+*/
+
+CREATE TABLE TagPairScores AS
+
+WITH TagPairs AS (
+    SELECT
+        TagId1,
+        TagId2,
+        SUM(PairCount)::BIGINT AS PairCount
+    FROM
+        TagPairPartialCounts
+    GROUP BY
+        TagId1, TagId2
+),
+
+     NormalizedTagPairs AS (
+         SELECT
+             -- Order the tag names alphabetically within a pair
+             LEAST(t1.TagName, t2.TagName) AS Tag1,
+             GREATEST(t1.TagName, t2.TagName) AS Tag2,
+             tp.PairCount,
+             -- Calculate the normalized score by dividing the pair count by the sum of individual tag counts
+             (tp.PairCount::FLOAT / (t1.Count + t2.Count)) AS NormalizedScore
+         FROM
+             TagPairs tp
+                 JOIN
+             Tags t1 ON tp.TagId1 = t1.Id
+                 JOIN
+             Tags t2 ON tp.TagId2 = t2.Id
+     )
+
+SELECT
+    Tag1,
+    Tag2,
+    PairCount,
+    NormalizedScore
+FROM
+    NormalizedTagPairs
+ORDER BY
+    NormalizedScore DESC;
@@ -0,0 +1,31 @@
+/*
+This SQL script creates the table PostTags that maps every question to its tags by their ids.
+The Tags column of the Posts table contains the tags as concatenated text (e.g. "<python><pandas>"). Splitting it
+is expensive, so we do it only once when the data is loaded instead of in every query that needs the tags.
+
+- Only questions (PostTypeId 1) have tags.
+- Tags that don't exist in the Tags table are dropped.
+- The synonyms are resolved by resolve-post-tag-synonyms.sql.
+*/
+
+DROP TABLE IF EXISTS PostTags;
+
+CREATE TABLE PostTags AS
+    SELECT DISTINCT
+        p.Id AS PostId,
+        t.Id AS TagId
+    FROM
+        Posts p
+            CROSS JOIN LATERAL
+        -- Split tags into individual elements, removing surrounding <>
+            unnest(string_to_array(trim(both '<>' from p.Tags), '><')) AS u(TagName)
+            JOIN
+        Tags t ON t.TagName = u.TagName
+    WHERE
+        p.PostTypeId = 1;
+
+-- The primary key serves the self-join on PostId when the tag pairs are counted
+ALTER TABLE PostTags ADD PRIMARY KEY (PostId, TagId);
+CREATE INDEX PostTags_TagId_PostId_idx ON PostTags (TagId, PostId);
+
+ANALYZE PostTags;
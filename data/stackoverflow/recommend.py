@@ -0,0 +1,131 @@
+import heapq
+import json
+from collections import defaultdict
+from typing import Dict, List
+
+import numpy as np
+from scipy.sparse import csr_matrix, diags
+
+EDGE_WEIGHT_PROP = "weight"
+RESTART_PROBABILITY = 0.15  # probability that the random walk jumps back to the seed tag in every step
+TOP_K = 50  # number of recommendations stored per tag
+BATCH_SIZE = 256  # number of seed tags whose walks are computed together
+MAX_ITERATIONS = 100
+TOLERANCE = 1e-8
+
+Recommendations = Dict[str, List[Dict]]
+
+
+def build_transition_matrix(tags: List[str], tag_pairs_json: List[Dict]) -> csr_matrix:
+    """
+    Build the column-stochastic transition matrix of a random walk on the weighted tag graph, i.e. the weighted
+    adjacency matrix (as in cluster.py) with every column divided by its sum.
+    """
+    tag_to_index = {tag: index for index, tag in enumerate(tags)}
+    row = []
+    col = []
+    data = []
+    for edge in tag_pairs_json:
+        i, j = tag_to_index[edge["tag1"]], tag_to_index[edge["tag2"]]
+        weight = edge[EDGE_WEIGHT_PROP]
+        row.extend([i, j])
+        col.extend([j, i])
+        data.extend([weight, weight])
+    adjacency = csr_matrix((data, (row, col)), shape=(len(tags), len(tags)))
+
+    degrees = np.asarray(adjacency.sum(axis=0)).ravel()
+    inverse_degrees = np.divide(1.0, degrees, out=np.zeros_like(degrees), where=degrees > 0)
+    return (adjacency @ diags(inverse_degrees)).tocsr()
+
+
+def personalized_pagerank(transition: csr_matrix, seeds: np.ndarray) -> np.ndarray:
+    """
+    Run a random walk with restart for a batch of seed tags at once.
+    Every column of the result holds the visiting probabilities of the walk that restarts at one seed tag.
+    A step of all walks is a single product of the sparse transition matrix with the dense (tags x seeds) block.
+    Probability mass that is lost at tags without edges goes back to the seed, like a restart.
+
+    :param transition:  Column-stochastic transition matrix (see build_transition_matrix)
+    :param seeds:       Indices of the seed tags
+    :return:            Dense (tags x seeds) matrix of the visiting probabilities
+    """
+    restart = np.zeros((transition.shape[0], len(seeds)))
+    restart[seeds, np.arange(len(seeds))] = 1.0
+
+    scores = restart.copy()
+    for _ in range(MAX_ITERATIONS):
+        next_scores = (1 - RESTART_PROBABILITY) * (transition @ scores)
+        next_scores += (1 - next_scores.sum(axis=0)) * restart
+        converged = np.abs(next_scores - scores).sum(axis=0).max() < TOLERANCE
+        scores = next_scores
+        if converged:
+            break
+    return scores
+
+
+def build_recommendation_index(tags: List[str], transition: csr_matrix, k: int = TOP_K) -> Recommendations:
+    """
+    Compute the top-k recommendations for every tag, i.e. the tags with the highest personalized PageRank score.
+
+    :param tags:        Tag names in the order of the transition matrix
+    :param transition:  Column-stochastic transition matrix (see build_transition_matrix)
+    :param k:           Number of recommendations per tag
+    :return:            Recommendations by tag, e.g. { "reactjs": [{ "tag": "redux", "score": 0.03 }, ...] }
+    """
+    index = {}
+    for start in range(0, len(tags), BATCH_SIZE):
+        seeds = np.arange(start, min(start + BATCH_SIZE, len(tags)))
+        scores = personalized_pagerank(transition, seeds)
+        # A tag is not a recommendation for itself
+        scores[seeds, np.arange(len(seeds))] = 0
+
+        count = min(k, len(tags) - 1)
+        if count <= 0:
+            index.update({tags[seed]: [] for seed in seeds})
+            continue
+        top_indices = np.argpartition(-scores, count - 1, axis=0)[:count]
+        for column, seed in enumerate(seeds):
+            candidates = sorted(top_indices[:, column], key=lambda candidate: -scores[candidate, column])
+            index[tags[seed]] = [
+                {"tag": tags[candidate], "score": float(scores[candidate, column])}
+                for candidate in candidates
+                if scores[candidate, column] > 0
+            ]
+        print(f"Computed recommendations for {seeds[-1] + 1}/{len(tags)} tags")
+    return index
+
+
+def combine_recommendations(index: Recommendations, skills: Dict[str, float], k: int) -> List[Dict]:
+    """
+    Recommend what to learn next for a profile with multiple skills.
+    The personalized PageRank is linear in the restart distribution, so the scores of a profile are the sum of the
+    scores of its skills, weighted by the skill level. We use the stored top-k lists, which is a close approximation.
+
+    :param index:   Recommendations by tag (see build_recommendation_index)
+    :param skills:  Skill level (between 0 and 1) by tag
+    :param k:       Number of recommendations
+    :return:        Top-k recommendations, without the tags that are already part of the profile
+    """
+    scores = defaultdict(float)
+    for tag, level in skills.items():
+        for recommendation in index.get(tag, []):
+            scores[recommendation["tag"]] += level * recommendation["score"]
+
+    candidates = ((tag, score) for tag, score in scores.items() if not skills.get(tag))
+    return [{"tag": tag, "score": score} for tag, score in heapq.nlargest(k, candidates, key=lambda item: item[1])]
+
+
+if __name__ == "__main__":
+    with open("result/tags.json", "r") as f:
+        tags_json = json.load(f)
+    with open("result/tag-pairs.json", "r") as f:
+        tag_pairs_json = json.load(f)
+
+    tag_names = [tag["tag"] for tag in tags_json]
+    transition_matrix = build_transition_matrix(tag_names, tag_pairs_json)
+    recommendations = build_recommendation_index(tag_names, transition_matrix)
+
+    with open("result/recommendations.json", "w") as f:
+        json.dump(recommendations, f, indent=2)
+
+    print(f"Stored {TOP_K} recommendations for {len(recommendations)} tags.")
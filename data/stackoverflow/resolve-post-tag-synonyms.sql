@@ -0,0 +1,31 @@
+/*
+This SQL script replaces all synonym tags in the PostTags table with their primary tags.
+It has to run whenever the PostTags or the TagSynonyms table changed.
+If a post has both a synonym and its primary tag, the primary tag is only kept once.
+*/
+
+CREATE TABLE IF NOT EXISTS TagSynonyms (
+    PrimaryTag TEXT,
+    SynonymTag TEXT
+);
+
+INSERT INTO PostTags (PostId, TagId)
+    SELECT
+        pt.PostId,
+        primary_tag.Id
+    FROM
+        PostTags pt
+            JOIN
+        Tags synonym_tag ON synonym_tag.Id = pt.TagId
+            JOIN
+        TagSynonyms ts ON ts.SynonymTag = synonym_tag.TagName
+            JOIN
+        Tags primary_tag ON primary_tag.TagName = ts.PrimaryTag
+ON CONFLICT DO NOTHING;
+
+DELETE FROM PostTags pt
+    USING Tags synonym_tag, TagSynonyms ts
+    WHERE synonym_tag.Id = pt.TagId AND
+          ts.SynonymTag = synonym_tag.TagName;
+
+ANALYZE PostTags;
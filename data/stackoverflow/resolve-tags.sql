@@ -1,23 +1,12 @@
-WITH UnnestedTags AS (
-    SELECT
-        p.Id AS PostId,
-        -- Split tags into individual elements, removing surrounding <>
-        unnest(string_to_array(trim(both '<>' from p.Tags), '><')) AS OriginalTag
-    FROM
-        FilteredPosts p
-),
-
--- CTE to replace synonym tags with their primary tags
-     ResolvedTags AS (
-         SELECT
-             u.PostId,
-             -- Use COALESCE to select the primary tag if available; otherwise, keep the original tag
-             COALESCE(ts.PrimaryTag, u.OriginalTag) AS Tag
-         FROM
-             UnnestedTags u
-                 LEFT JOIN
-             -- Join with TagSynonyms to find synonym mappings
-                 TagSynonyms ts ON u.OriginalTag = ts.SynonymTag
-     )
-
-SELECT tag, count(*) from ResolvedTags group by tag order by count desc;
+-- Count the (synonym-resolved) tags of the filtered posts
+SELECT
+    t.TagName AS tag,
+    count(*)
+FROM
+    PostTags pt
+        JOIN
+    FilteredPosts p ON p.Id = pt.PostId
+        JOIN
+    Tags t ON t.Id = pt.TagId
+GROUP BY t.TagName
+ORDER BY count DESC;
@@ -0,0 +1,32 @@
+/*
+This SQL script counts the tag pairs of the filtered posts in one id range (= partition) and stores the partial
+counts in the table TagPairPartialCounts. It is the partitioned equivalent of the TagPairs CTE in score-tag-pairs.sql.
+A post is only in one partition, so the partial counts of all partitions can simply be summed up afterward.
+*/
+
+WITH FilteredPostTags AS (
+    SELECT
+        pt.PostId,
+        pt.TagId
+    FROM
+        PostTags pt
+            JOIN
+        FilteredPosts p ON p.Id = pt.PostId
+    WHERE
+        pt.PostId BETWEEN %(min_post_id)s AND %(max_post_id)s AND
+        p.Id BETWEEN %(min_post_id)s AND %(max_post_id)s
+)
+
+INSERT INTO TagPairPartialCounts (PartitionId, TagId1, TagId2, PairCount)
+SELECT
+    %(partition_id)s,
+    a.TagId,
+    b.TagId,
+    COUNT(*)
+FROM
+    FilteredPostTags a
+        JOIN
+    -- Join FilteredPostTags with itself to form pairs, ensuring a.TagId < b.TagId to avoid duplicates
+        FilteredPostTags b ON a.PostId = b.PostId AND a.TagId < b.TagId
+GROUP BY
+    a.TagId, b.TagId;
@@ -1,17 +1,142 @@
-import psycopg
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Tuple
 
-from stackoverflow.config import POSTGRES_CONFIG
+from stackoverflow.database import POOL_MAX_SIZE, connection
 
+Partition = Tuple[int, int, int]  # (partition id, min post id, max post id)
 
-def score_tag_pairs() -> None:
-    conn = psycopg.connect(**POSTGRES_CONFIG, autocommit=True)
-    cur = conn.cursor()
 
-    sql_file = open('score-tag-pairs.sql', 'r')
+def score_tag_pairs() -> None:
+    with open('score-tag-pairs.sql', 'r') as sql_file:
+        query = sql_file.read()
 
     print("Generating table for normalized tag-pair scores...")
-    cur.execute(sql_file.read())
+    with connection('score', autocommit=True) as conn:
+        conn.execute(query)
+
+
+def _plan_partitions(partition_count: int) -> List[Partition]:
+    """
+    Split the ids of the filtered posts into equally sized ranges and store them in the table TagPairPartitions.
+    If the table already exists from an interrupted run, its partitions are kept, so the run can be resumed.
+
+    :param partition_count: Number of partitions for a new run
+    :return:                The partitions that are not done yet
+    """
+    with connection('score') as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS TagPairPartitions (
+                PartitionId INTEGER PRIMARY KEY,
+                MinPostId INTEGER NOT NULL,
+                MaxPostId INTEGER NOT NULL,
+                Done BOOLEAN NOT NULL DEFAULT FALSE
+            );
+            CREATE TABLE IF NOT EXISTS TagPairPartialCounts (
+                PartitionId INTEGER NOT NULL,
+                TagId1 INTEGER NOT NULL,
+                TagId2 INTEGER NOT NULL,
+                PairCount BIGINT NOT NULL
+            );
+        """)
+
+        existing_count = conn.execute("SELECT count(*) FROM TagPairPartitions").fetchone()[0]
+        if existing_count:
+            print(f"Resuming the {existing_count} partitions of a previous run.")
+        else:
+            min_post_id, max_post_id = conn.execute("SELECT min(Id), max(Id) FROM FilteredPosts").fetchone()
+            size = (max_post_id - min_post_id) // partition_count + 1
+            conn.cursor().executemany(
+                "INSERT INTO TagPairPartitions (PartitionId, MinPostId, MaxPostId) VALUES (%s, %s, %s)",
+                [
+                    (partition_id, min_post_id + partition_id * size, min_post_id + (partition_id + 1) * size - 1)
+                    for partition_id in range(partition_count)
+                ]
+            )
+
+        return conn.execute("""
+            SELECT PartitionId, MinPostId, MaxPostId FROM TagPairPartitions WHERE NOT Done ORDER BY PartitionId
+        """).fetchall()
+
+
+def _score_partition(query: str, partition: Partition) -> int:
+    """
+    Count the tag pairs of one partition on its own connection.
+    The partial counts are inserted and the partition is marked as done in one transaction, so a failed or
+    interrupted partition leaves nothing behind and is simply computed again on the next run.
+
+    :return: Number of partial tag-pair counts of the partition
+    """
+    partition_id, min_post_id, max_post_id = partition
+    with connection('score_partition') as conn:
+        with conn.transaction():
+            cur = conn.execute(query, {
+                'partition_id': partition_id,
+                'min_post_id': min_post_id,
+                'max_post_id': max_post_id,
+            })
+            conn.execute("UPDATE TagPairPartitions SET Done = TRUE WHERE PartitionId = %s", (partition_id,))
+    return cur.rowcount
+
+
+def score_tag_pairs_partitioned(partition_count: int, workers: int) -> None:
+    """
+    Generate the table for the normalized tag-pair scores partition by partition.
+    The partitions are ranges of FilteredPosts.Id, their pair counts are computed in parallel on separate connections.
+    Once all partitions are done, the partial counts are merged into TagPairScores and normalized.
+    If partitions fail, run it again to compute only those.
+
+    :param partition_count: Number of partitions (ignored when resuming)
+    :param workers:         Number of partitions that are computed at the same time
+    """
+    with open('score-tag-pairs-partition.sql', 'r') as sql_file:
+        partition_query = sql_file.read()
+    with open('merge-tag-pair-partitions.sql', 'r') as sql_file:
+        merge_query = sql_file.read()
+
+    # Every worker needs its own connection from the pool
+    workers = min(workers, POOL_MAX_SIZE)
+    pending_partitions = _plan_partitions(partition_count)
+    print(f"Counting tag pairs of {len(pending_partitions)} partitions with {workers} workers...")
+
+    failed_partitions = []
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(workers) as executor:
+        futures = {
+            executor.submit(_score_partition, partition_query, partition): partition
+            for partition in pending_partitions
+        }
+        for index, future in enumerate(as_completed(futures), start=1):
+            partition_id, min_post_id, max_post_id = futures[future]
+            try:
+                pair_count = future.result()
+                print(f"[{index}/{len(futures)}] Partition {partition_id} (posts {min_post_id}-{max_post_id}): "
+                      f"{pair_count} tag pairs after {time.perf_counter() - start_time:.0f}s")
+            except Exception as e:
+                failed_partitions.append(partition_id)
+                print(f"[{index}/{len(futures)}] Partition {partition_id} (posts {min_post_id}-{max_post_id}) "
+                      f"failed:\n{e}")
+
+    if failed_partitions:
+        print(f"{len(failed_partitions)} partitions failed: {failed_partitions}. Run the script again to resume them.")
+        return
+
+    print("Merging the partitions into the table for normalized tag-pair scores...")
+    with connection('score') as conn:
+        conn.execute(merge_query)
+        conn.execute("DROP TABLE TagPairPartialCounts, TagPairPartitions")
 
 
 if __name__ == "__main__":
-    score_tag_pairs()
+    parser = argparse.ArgumentParser(description="Calculate the normalized scores of all tag pairs.")
+    parser.add_argument("--partitions", type=int,
+                        help="Split the posts into this many id ranges that are counted separately and can be resumed.")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Number of partitions that are counted in parallel (default: 4).")
+    args = parser.parse_args()
+
+    if args.partitions:
+        score_tag_pairs_partitioned(args.partitions, args.workers)
+    else:
+        score_tag_pairs()
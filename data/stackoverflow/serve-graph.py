@@ -0,0 +1,253 @@
+import argparse
+import json
+import math
+import os
+from functools import lru_cache
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+
+from recommend import Recommendations, combine_recommendations
+
+EDGE_WEIGHT_PROP = "weight"
+RESULT_FOLDER = "result/"
+DEFAULT_NEIGHBOR_COUNT = 10
+CACHE_SIZE = 4096
+
+Response = Tuple[int, bytes]
+
+
+class GraphIndex:
+    def __init__(self, tags_json: List[Dict], tag_pairs_json: List[Dict]):
+        """
+        In-memory index of the skill graph for fast lookups.
+        The edges are stored as a symmetric adjacency matrix in CSR format (indptr, indices, weights), where the
+        neighbors of every tag are sorted by descending weight. That way, the top-k neighbors of a tag are a slice.
+
+        :param tags_json:       Content of tags.json (with the cluster assignments of cluster.py)
+        :param tag_pairs_json:  Content of tag-pairs.json (with the weights of calculate-weight.py)
+        """
+        self.tags = [tag["tag"] for tag in tags_json]
+        self.tag_to_index = {tag: index for index, tag in enumerate(self.tags)}
+        self.counts = [tag["count"] for tag in tags_json]
+        self.clusters = [tag.get("cluster") for tag in tags_json]
+
+        self.cluster_to_indices: Dict[int, List[int]] = {}
+        for index, cluster in enumerate(self.clusters):
+            if cluster is not None:
+                self.cluster_to_indices.setdefault(cluster, []).append(index)
+
+        edges = [
+            (self.tag_to_index[pair["tag1"]], self.tag_to_index[pair["tag2"]], pair[EDGE_WEIGHT_PROP])
+            for pair in tag_pairs_json
+            if pair["tag1"] in self.tag_to_index and pair["tag2"] in self.tag_to_index
+        ]
+        sources = np.array([i for i, j, _ in edges] + [j for i, j, _ in edges], dtype=np.int32)
+        targets = np.array([j for i, j, _ in edges] + [i for i, j, _ in edges], dtype=np.int32)
+        weights = np.array([weight for _, _, weight in edges] * 2, dtype=np.float64)
+
+        # Sort by source first and by descending weight second
+        order = np.lexsort((-weights, sources))
+        self.indices = targets[order]
+        self.weights = weights[order]
+        self.indptr = np.concatenate(([0], np.cumsum(np.bincount(sources, minlength=len(self.tags)))))
+
+    def _node(self, index: int) -> Dict:
+        return {
+            "tag": self.tags[index],
+            "count": self.counts[index],
+            "cluster": self.clusters[index],
+            "degree": int(self.indptr[index + 1] - self.indptr[index]),
+        }
+
+    def node(self, tag: str) -> Optional[Dict]:
+        index = self.tag_to_index.get(tag)
+        return None if index is None else self._node(index)
+
+    def _top_k_end(self, index: int, k: int) -> int:
+        """End of the top-k neighbors of a tag in the CSR arrays. k is clamped to [0, degree] in plain Python ints."""
+        start, end = int(self.indptr[index]), int(self.indptr[index + 1])
+        return start + max(0, min(k, end - start))
+
+    def neighbors(self, tag: str, k: int) -> Optional[List[Dict]]:
+        """Get the k neighbors of a tag with the highest edge weights."""
+        index = self.tag_to_index.get(tag)
+        if index is None:
+            return None
+        start = self.indptr[index]
+        end = self._top_k_end(index, k)
+        return [
+            {"tag": self.tags[neighbor], "weight": float(weight)}
+            for neighbor, weight in zip(self.indices[start:end], self.weights[start:end])
+        ]
+
+    def cluster(self, cluster: int) -> Optional[List[str]]:
+        indices = self.cluster_to_indices.get(cluster)
+        return None if indices is None else [self.tags[index] for index in indices]
+
+    def subgraph(self, tags: List[str], k: int = 0) -> Dict:
+        """
+        Extract the subgraph induced by a list of tags.
+
+        :param tags:    The tags of the subgraph. Unknown tags are ignored.
+        :param k:       If greater than 0, the top-k neighbors of every tag are added to the subgraph as well.
+        :return:        The nodes (as returned by node()) and the edges between them (like in tag-pairs.json)
+        """
+        selected = {self.tag_to_index[tag] for tag in tags if tag in self.tag_to_index}
+        if k > 0:
+            selected |= {
+                int(neighbor)
+                for index in list(selected)
+                for neighbor in self.indices[self.indptr[index]:self._top_k_end(index, k)]
+            }
+
+        rows = np.array(sorted(selected), dtype=np.int64)
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        # Positions of all edges of the selected rows in the CSR arrays, without a Python loop over the rows
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        sources = np.repeat(rows, lengths)
+        neighbors = self.indices[positions]
+
+        selected_mask = np.zeros(len(self.tags), dtype=bool)
+        selected_mask[rows] = True
+        # Every edge is stored in both directions, only keep one of them
+        mask = selected_mask[neighbors] & (neighbors > sources)
+        edges = [
+            {"tag1": self.tags[source], "tag2": self.tags[neighbor], EDGE_WEIGHT_PROP: float(weight)}
+            for source, neighbor, weight in zip(sources[mask], neighbors[mask], self.weights[positions[mask]])
+        ]
+
+        return {
+            "nodes": [self._node(index) for index in rows],
+            "edges": edges,
+        }
+
+
+def load_graph_index(result_dir: str) -> GraphIndex:
+    with open(os.path.join(result_dir, "tags.json"), "r") as f:
+        tags_json = json.load(f)
+    with open(os.path.join(result_dir, "tag-pairs.json"), "r") as f:
+        tag_pairs_json = json.load(f)
+    return GraphIndex(tags_json, tag_pairs_json)
+
+
+def load_recommendations(result_dir: str) -> Optional[Recommendations]:
+    """Load the recommendation index of recommend.py, if it was generated."""
+    if not os.path.exists(os.path.join(result_dir, "recommendations.json")):
+        return None
+    with open(os.path.join(result_dir, "recommendations.json"), "r") as f:
+        return json.load(f)
+
+
+def parse_skills(value: str) -> Dict[str, float]:
+    """
+    Parse a skill profile like "reactjs:0.8,redux:0.5". The level is 1 if it's omitted.
+    Raises a ValueError for levels outside of 0..1 (including nan and inf, which can't be serialized to JSON).
+    """
+    skills = {}
+    for skill in value.split(","):
+        tag, separator, level = skill.rpartition(":")
+        if separator:
+            skills[tag] = float(level)
+            if not math.isfinite(skills[tag]) or not 0 <= skills[tag] <= 1:
+                raise ValueError(f"The level of {tag} must be between 0 and 1")
+        elif level:
+            skills[level] = 1.0
+    return skills
+
+
+def parse_count(params: Dict[str, List[str]], name: str, default: int) -> int:
+    """Parse a non-negative integer query parameter like k. Raises a ValueError for invalid values."""
+    count = int(params.get(name, [default])[0])
+    if count < 0:
+        raise ValueError(f"{name} must not be negative")
+    return count
+
+
+def make_request_handler(
+        graph_index: GraphIndex,
+        recommendations: Optional[Recommendations] = None,
+        cache_size: int = CACHE_SIZE,
+):
+    """
+    Create the HTTP request handler for a graph index. The following routes are supported:
+
+    - GET /nodes/<tag>                          -> the tag with its count, cluster and degree
+    - GET /nodes/<tag>/neighbors?k=10           -> the top-k neighbors of the tag by weight
+    - GET /clusters/<cluster>                   -> the tags of a cluster
+    - GET /subgraph?tags=react,redux&k=5        -> the subgraph induced by the tags (and their top-k neighbors)
+    - GET /recommendations?skills=react:0.8&k=10 -> what to learn next for a skill profile (needs recommend.py)
+
+    Tags have to be URL-encoded (e.g. c%23 for c#). The responses are cached in an LRU cache.
+    """
+
+    def json_response(data) -> Response:
+        if data is None:
+            return HTTPStatus.NOT_FOUND, b'{"error": "not found"}'
+        return HTTPStatus.OK, json.dumps(data).encode("utf-8")
+
+    @lru_cache(maxsize=cache_size)
+    def respond(path: str, query: str) -> Response:
+        segments = [unquote(segment) for segment in path.strip("/").split("/")]
+        params = parse_qs(query)
+        try:
+            k = parse_count(params, "k", DEFAULT_NEIGHBOR_COUNT)
+            match segments:
+                case ["nodes", tag]:
+                    return json_response(graph_index.node(tag))
+                case ["nodes", tag, "neighbors"]:
+                    return json_response(graph_index.neighbors(tag, k))
+                case ["clusters", cluster]:
+                    return json_response(graph_index.cluster(int(cluster)))
+                case ["subgraph"]:
+                    tags = [tag for value in params.get("tags", []) for tag in value.split(",") if tag]
+                    return json_response(graph_index.subgraph(tags, parse_count(params, "k", 0)))
+                case ["recommendations"] if recommendations is not None:
+                    skills = parse_skills(",".join(params.get("skills", [])))
+                    return json_response(combine_recommendations(recommendations, skills, k))
+        except (ValueError, OverflowError) as e:
+            return HTTPStatus.BAD_REQUEST, json.dumps({"error": str(e)}).encode("utf-8")
+        return HTTPStatus.NOT_FOUND, b'{"error": "unknown route"}'
+
+    class GraphRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlsplit(self.path)
+            status, body = respond(url.path, url.query)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            # The app runs on a different port during development
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Logging every request to stderr costs more than answering it
+            pass
+
+    return GraphRequestHandler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve node, neighbor, cluster and subgraph queries on the skill graph.")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on (default: 8000).")
+    parser.add_argument("--result_dir", type=str, default=RESULT_FOLDER,
+                        help="Folder with tags.json and tag-pairs.json (default: result/).")
+    args = parser.parse_args()
+
+    index = load_graph_index(args.result_dir)
+    print(f"Loaded {len(index.tags)} tags and {len(index.indices) // 2} tag pairs.")
+    recommendation_index = load_recommendations(args.result_dir)
+    if recommendation_index is None:
+        print("No recommendations.json found, run recommend.py to enable the recommendations.")
+
+    server = ThreadingHTTPServer(("localhost", args.port), make_request_handler(index, recommendation_index))
+    print(f"Serving on http://localhost:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()